@@ -0,0 +1,157 @@
+# coding=utf-8
+"""
+This file contains ChromeTraceWriter, which exports the states of the
+processes of a Simulation as a timeline in the Chrome trace-event JSON format
+(chrome://tracing, https://ui.perfetto.dev).
+
+Every process is a thread of the timeline. Each of its states (scheduled,
+holding, queued in the waitQ of a Resource or the getQ or putQ of a Level or
+Store, waiting or queueing for a SimEvent, waiting until a condition, passive)
+becomes a span from the time the process entered it until its next state;
+its termination is an instant event. Renege timers and scheduled calls are not
+shown. Simulation time t is written as timestamp t * timeScale microseconds.
+
+"""
+from __future__ import print_function
+
+import json
+
+from SimPy.Simulation import hold, passivate, request, release, waitevent, \
+        queueevent, waituntil, get, put, Process, LightProcess
+
+
+# A span; the first event of the trace is the process name, so each span
+# follows another event
+_span = (',\n{"cat": "%s", "dur": %r, "name": %s, "ph": "X", "pid": 1, '
+         '"tid": %d, "ts": %r}')
+
+
+class ChromeTraceWriter(object):
+    """
+    Writes the process timeline of Simulation sim to outfile (a file name
+    or a file object open for writing) while the simulation runs. Spans of
+    zero duration are left out. close() ends the open spans, completes the
+    JSON array and stops the export.
+    """
+    # command -> (category, name of the state); the name is followed by the
+    # name of the resource, buffer or event concerned
+    states = {hold: ('hold', 'holding'), passivate: ('passive', 'passive'),
+              request: ('queued', 'waitQ'), release: ('active', 'active'),
+              waitevent: ('event', 'waiting for'),
+              queueevent: ('event', 'queueing for'),
+              waituntil: ('condition', 'waituntil'),
+              get: ('queued', 'getQ'), put: ('queued', 'putQ')}
+
+    def __init__(self, sim, outfile, timeScale = 1e6, name = 'SimPy'):
+        self.sim = sim
+        if hasattr(outfile, 'write'):
+            self.outfile = outfile
+            self._ownFile = False
+        else:
+            self.outfile = open(outfile, 'w')
+            self._ownFile = True
+        self.timeScale = timeScale
+        self.nrEvents = 0
+        # process -> [thread id, category, name as JSON string, start time]
+        self._current = {}
+        self._nrThreads = 0
+        # (command, target) -> (category, name as JSON string)
+        self._names = {}
+        self.outfile.write('[\n')
+        self._write({'name': 'process_name', 'ph': 'M', 'pid': 1,
+                     'args': {'name': name}})
+        self._hooks = [('activate', self._recordActivate),
+                       ('reactivate', self._recordActivate),
+                       ('dispatch', self._recordDispatch),
+                       ('terminate', self._recordTerminate)]
+        for kind, hook in self._hooks:
+            sim.addHook(kind, hook)
+
+    def _write(self, event):
+        if self.nrEvents:
+            self.outfile.write(',\n')
+        self.outfile.write(json.dumps(event, sort_keys = True))
+        self.nrEvents += 1
+
+    def _enter(self, proc, category, name):
+        """proc enters a new state at the current simulation time."""
+        now = self.sim._t
+        try:
+            state = self._current[proc]
+        except KeyError:
+            self._nrThreads += 1
+            self._current[proc] = [self._nrThreads, category, name, now]
+            self._write({'name': 'thread_name', 'ph': 'M', 'pid': 1,
+                         'tid': self._nrThreads,
+                         'args': {'name': proc.name}})
+            return
+        self._end(state, now)
+        state[1] = category
+        state[2] = name
+        state[3] = now
+
+    def _end(self, state, now):
+        tid, category, name, start = state
+        if now > start:
+            scale = self.timeScale
+            # Formatted directly: json.dumps per span would dominate the cost
+            self.outfile.write(_span % (category, (now - start) * scale, name,
+                                        tid, start * scale))
+            self.nrEvents += 1
+
+    def _recordActivate(self, proc, at, prior):
+        if not isinstance(proc, (Process, LightProcess)):
+            # a renege timer
+            return
+        if at > self.sim._t:
+            self._enter(proc, 'scheduled', '"scheduled"')
+        else:
+            self._enter(proc, 'active', '"active"')
+
+    def _recordDispatch(self, command, par):
+        whole, proc = par
+        if type(whole[0]) == tuple:
+            # compound yield: the primary command
+            whole = whole[0]
+        target = None
+        if len(whole) > 2 and command != hold and command != waituntil:
+            target = whole[2]
+            if type(target) in (list, tuple):
+                target = tuple(target)
+        try:
+            category, name = self._names[command, target]
+        except KeyError:
+            category, name = self.states[command]
+            if type(target) == tuple:
+                name = '%s %s' % (name, ', '.join([e.name for e in target]))
+            elif target is not None:
+                name = '%s %s' % (name, target.name)
+            name = json.dumps(name)
+            self._names[command, target] = (category, name)
+        self._enter(proc, category, name)
+
+    def _recordTerminate(self, proc):
+        now = self.sim._t
+        state = self._current.pop(proc, None)
+        if state is None:
+            return
+        self._end(state, now)
+        self._write({'name': 'terminated', 'cat': 'terminated', 'ph': 'i',
+                     's': 't', 'ts': now * self.timeScale, 'pid': 1,
+                     'tid': state[0]})
+
+    def close(self):
+        """Ends the open spans at the current simulation time, completes the
+        JSON array and stops the export."""
+        for kind, hook in self._hooks:
+            self.sim.removeHook(kind, hook)
+        self._hooks = []
+        now = self.sim._t
+        for state in sorted(self._current.values()):
+            self._end(state, now)
+        self._current = {}
+        self.outfile.write('\n]\n')
+        if self._ownFile:
+            self.outfile.close()
+        else:
+            self.outfile.flush()
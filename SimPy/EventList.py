@@ -0,0 +1,311 @@
+# coding=utf-8
+"""
+This file contains the event lists a Simulation can keep its event notices
+in: HeapEventList (a binary heap, the default) and CalendarQueue.
+
+An event notice is a tuple (at, sortpr, proc). Notices are ordered by time
+'at' and, for equal times, by the priority 'sortpr' handed out by
+Simulation._post. A notice is live as long as proc._rec refers to it;
+cancelling it just drops that reference. Cancelled notices stay in the event
+list until they reach its head or until the list is compacted.
+
+Event notices for the current time are not put into the time-ordered
+structure but into two lanes which are served before it: a LIFO lane for
+notices posted with prior=True and a FIFO lane for all others. This
+saves a push and a pop for every zero-delay event (granted requests, puts,
+gets, signals, 'yield hold, self') without changing the order of events.
+
+"""
+from bisect import insort
+from collections import deque
+from heapq import heappush, heappop, heapify, nsmallest
+
+
+class EventList(object):
+    """Superclass of event lists. It keeps the lanes for the current time;
+    subclasses keep all later event notices and implement _pushTimed,
+    _popTimed, _headTimed, _compactTimed, _lenTimed and _iterTimed.
+    """
+    def __init__(self):
+        # Number of cancelled event notices still held in the event list.
+        self.nrCancelled = 0
+        # Time of the event notice popped last.
+        self._now = 0
+        # Lanes for the event notices at time _now, prior ones (which have a
+        # negative sortpr) are served LIFO, the others FIFO.
+        self._priorLane = []
+        self._fifoLane = deque()
+
+    def push(self, rec):
+        """Adds event notice rec."""
+        if rec[0] == self._now:
+            if rec[1] < 0:
+                self._priorLane.append(rec)
+            else:
+                self._fifoLane.append(rec)
+        else:
+            self._pushTimed(rec)
+
+    def _head(self):
+        """Returns the lane holding the next event notice, or None if the
+        next notice is held by the subclass structure.
+        """
+        if self._priorLane:
+            return self._priorLane
+        if self._fifoLane:
+            # Notices posted for _now before the clock got there precede the
+            # FIFO lane.
+            head = self._headTimed()
+            if head is None or head[0] != self._now:
+                return self._fifoLane
+        return None
+
+    def popNext(self):
+        """Removes and returns the next uncancelled event notice. Returns None
+        if there is none.
+        """
+        while True:
+            lane = self._head()
+            if lane is self._priorLane:
+                rec = lane.pop()
+            elif lane is not None:
+                rec = lane.popleft()
+            else:
+                rec = self._popTimed()
+                if rec is None:
+                    return None
+            if rec[2]._rec is rec:
+                break
+            self.nrCancelled -= 1
+        self._now = rec[0]
+        return rec
+
+    def first(self):
+        """Returns the next uncancelled event notice without removing it.
+        Returns None if there is none.
+        """
+        while True:
+            lane = self._head()
+            if lane is self._priorLane:
+                rec = lane[-1]
+            elif lane is not None:
+                rec = lane[0]
+            else:
+                rec = self._headTimed()
+                if rec is None:
+                    return None
+            if rec[2]._rec is rec:
+                return rec
+            # Drop the cancelled notice.
+            if lane is self._priorLane:
+                lane.pop()
+            elif lane is not None:
+                lane.popleft()
+            else:
+                self._popTimed()
+            self.nrCancelled -= 1
+
+    def cancel(self, rec):
+        """Cancels event notice rec."""
+        rec[2]._rec = None
+        self.nrCancelled += 1
+
+    def compact(self):
+        """Removes all cancelled event notices."""
+        self._priorLane[:] = [rec for rec in self._priorLane
+                              if rec[2]._rec is rec]
+        self._fifoLane = deque([rec for rec in self._fifoLane
+                                if rec[2]._rec is rec])
+        self._compactTimed()
+        self.nrCancelled = 0
+
+    def notices(self):
+        """Returns the uncancelled event notices in the order of execution."""
+        return sorted([rec for rec in self if rec[2]._rec is rec])
+
+    def __len__(self):
+        return len(self._priorLane) + len(self._fifoLane) + self._lenTimed()
+
+    def __iter__(self):
+        for rec in self._priorLane:
+            yield rec
+        for rec in self._fifoLane:
+            yield rec
+        for rec in self._iterTimed():
+            yield rec
+
+    def __getitem__(self, index):
+        """Returns the index-th event notice in the order of execution,
+        cancelled notices included.
+        """
+        if index == 0:
+            lane = self._head()
+            if lane is self._priorLane:
+                return lane[-1]
+            elif lane is not None:
+                return lane[0]
+            elif self._lenTimed():
+                return self._headTimed()
+        return sorted(self)[index]
+
+
+class HeapEventList(EventList):
+    """Event list kept as a binary heap. Push and pop are O(log n)."""
+    def __init__(self):
+        EventList.__init__(self)
+        self._heap = []
+
+    def _pushTimed(self, rec):
+        heappush(self._heap, rec)
+
+    def _popTimed(self):
+        if self._heap:
+            return heappop(self._heap)
+        return None
+
+    def _headTimed(self):
+        if self._heap:
+            return self._heap[0]
+        return None
+
+    def _compactTimed(self):
+        self._heap = [rec for rec in self._heap if rec[2]._rec is rec]
+        heapify(self._heap)
+
+    def _lenTimed(self):
+        return len(self._heap)
+
+    def _iterTimed(self):
+        return iter(self._heap)
+
+
+class CalendarQueue(EventList):
+    """Event list kept as a calendar queue (R. Brown, 1988). Event notices are
+    hashed by time into buckets of a fixed width which are visited in turn
+    like the days of a calendar year. Push and pop are O(1) on average, if the
+    times of pending events are spread evenly.
+    The calendar is resized when the number of event notices doubles or
+    halves, and the bucket width is re-estimated when push and pop have to
+    scan too many entries on average.
+    """
+    minBuckets = 2
+    # Average number of buckets skipped per pop and of entries passed per
+    # push which triggers a re-estimation of the bucket width.
+    maxScan = 4
+
+    def __init__(self):
+        EventList.__init__(self)
+        self._resize(self.minBuckets, 1.0, [])
+
+    def _resize(self, nrBuckets, width, recs):
+        """Rebuilds the calendar with nrBuckets buckets of the given width
+        from the event notices recs.
+        """
+        self._nrBuckets = nrBuckets
+        self._width = width = float(width)
+        self._buckets = buckets = [[] for i in range(nrBuckets)]
+        # The 'day' (bucket number not yet reduced modulo nrBuckets) of the
+        # earliest event notice.
+        self._day = 0
+        if recs:
+            self._day = int(min(recs)[0] / width)
+        for rec in recs:
+            buckets[int(rec[0] / width) % nrBuckets].append(rec)
+        for bucket in buckets:
+            bucket.sort()
+        self._size = len(recs)
+        # Buckets and entries scanned by, and number of, push and pop
+        # operations since the last resize.
+        self._scanned = 0
+        self._ops = 0
+
+    def _newWidth(self, recs):
+        """Estimates a bucket width from the separation of the earliest event
+        notices in recs, so that a bucket holds about three of them.
+        """
+        times = [rec[0] for rec in nsmallest(25, recs)]
+        gaps = [b - a for a, b in zip(times, times[1:]) if b > a]
+        if not gaps:
+            return self._width
+        return 3.0 * sum(gaps) / len(gaps)
+
+    def _rebuild(self, nrBuckets):
+        """Rebuilds the calendar with nrBuckets buckets, dropping all
+        cancelled event notices.
+        """
+        recs = [rec for rec in self._iterTimed() if rec[2]._rec is rec]
+        self.nrCancelled -= self._size - len(recs)
+        self._resize(nrBuckets, self._newWidth(recs), recs)
+
+    def _pushTimed(self, rec):
+        day = int(rec[0] / self._width)
+        bucket = self._buckets[day % self._nrBuckets]
+        # Buckets are kept sorted.
+        if not bucket or bucket[-1] < rec:
+            bucket.append(rec)
+        else:
+            insort(bucket, rec)
+            self._scanned += len(bucket)
+        if day < self._day or self._size == 0:
+            self._day = day
+        self._size += 1
+        self._ops += 1
+        if self._size > 2 * self._nrBuckets:
+            self._rebuild(2 * self._nrBuckets)
+
+    def _findNext(self):
+        """Returns the bucket holding the earliest event notice and moves
+        the calendar to its day. Returns None if the calendar is empty.
+        """
+        if not self._size:
+            return None
+        buckets = self._buckets
+        nrBuckets = self._nrBuckets
+        width = self._width
+        day = self._day
+        for i in range(nrBuckets):
+            bucket = buckets[day % nrBuckets]
+            if bucket and int(bucket[0][0] / width) <= day:
+                self._day = day
+                self._scanned += i
+                return bucket
+            day += 1
+        # No event notice within a whole year: search the bucket heads.
+        self._scanned += nrBuckets
+        bucket = min([b for b in buckets if b], key=lambda b: b[0])
+        self._day = int(bucket[0][0] / width)
+        return bucket
+
+    def _popTimed(self):
+        bucket = self._findNext()
+        if bucket is None:
+            return None
+        rec = bucket.pop(0)
+        self._size -= 1
+        self._ops += 1
+        if (self._nrBuckets > self.minBuckets and
+                self._size < self._nrBuckets // 2):
+            self._rebuild(self._nrBuckets // 2)
+        elif (2 * self._ops > self._nrBuckets and
+                self._scanned > self.maxScan * self._ops):
+            self._rebuild(self._nrBuckets)
+        return rec
+
+    def _headTimed(self):
+        bucket = self._findNext()
+        if bucket is None:
+            return None
+        return bucket[0]
+
+    def _compactTimed(self):
+        for bucket in self._buckets:
+            bucket[:] = [rec for rec in bucket if rec[2]._rec is rec]
+        self._size = sum([len(bucket) for bucket in self._buckets])
+
+    def _lenTimed(self):
+        return self._size
+
+    def _iterTimed(self):
+        for bucket in self._buckets:
+            for rec in bucket:
+                yield rec
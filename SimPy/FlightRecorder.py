@@ -0,0 +1,110 @@
+# coding=utf-8
+"""
+This file contains FlightRecorder, which keeps the most recent events of a
+Simulation in a bounded buffer and writes them out when an exception escapes
+from simulate(), or on request.
+
+"""
+from __future__ import print_function
+
+import sys
+import traceback
+from collections import deque
+
+from SimPy.TraceFile import kinds, decode, formatRecord
+
+
+class FlightRecorder(object):
+    """
+    Records the last size dispatched yield commands, event notices posted,
+    signals and process terminations of Simulation sim. A record is a small
+    tuple holding references to the objects involved; it is formatted only
+    by dump(). If an exception escapes from sim.simulate(), the records are
+    dumped to outfile (default: sys.stderr) before the exception propagates.
+    """
+    def __init__(self, sim, size = 5000, outfile = None):
+        self.sim = sim
+        self.size = size
+        self.outfile = outfile
+        # (time, kind, a, b), oldest first
+        self.records = deque(maxlen = size)
+        self._append = self.records.append
+        self._hooks = [('dispatch', self._recordDispatch),
+                       ('post', self._recordPost),
+                       ('signal', self._recordSignal),
+                       ('terminate', self._recordTerminate)]
+        for kind, hook in self._hooks:
+            sim.addHook(kind, hook)
+        # Guard simulate of this instance only
+        self._simulate = sim.simulate
+        sim.simulate = self._guardedSimulate
+
+    def close(self):
+        """Stops recording."""
+        for kind, hook in self._hooks:
+            self.sim.removeHook(kind, hook)
+        self._hooks = []
+        if self.sim.__dict__.get('simulate') == self._guardedSimulate:
+            del self.sim.simulate
+
+    def _guardedSimulate(self, *args, **kwargs):
+        try:
+            return self._simulate(*args, **kwargs)
+        except Exception:
+            outfile = self.outfile
+            if outfile is None:
+                outfile = sys.stderr
+            print('%s escaped from simulate at time %s' % (
+                  ''.join(traceback.format_exception_only(
+                      *sys.exc_info()[:2])).strip(), self.sim._t),
+                  file = outfile)
+            self.dump(outfile)
+            raise
+
+    def _recordDispatch(self, command, par):
+        self._append((self.sim._t, command, par, None))
+
+    def _recordPost(self, what, at, prior = False):
+        self._append((self.sim._t, 'post', what, at))
+
+    def _recordSignal(self, evt):
+        self._append((self.sim._t, 'signal', evt, None))
+
+    def _recordTerminate(self, proc):
+        self._append((self.sim._t, 'terminated', proc, None))
+
+    def lines(self):
+        """Returns the records as trace lines, oldest first."""
+        lines = []
+        for t, kind, a, b in self.records:
+            if kind == 'post':
+                # trace files have no posts, so formatRecord has no format
+                lines.append('%s post <%s> at time: %s' % (t, _name(a), b))
+                continue
+            if kind == 'signal':
+                record = (t, kind, None, _name(a), 0)
+            elif kind == 'terminated':
+                record = (t, kind, _name(a), None, 0)
+            else:
+                target, arg = decode(kind, a[0])
+                record = (t, kinds[kind], _name(a[1]), _name(target), arg)
+            lines.append(formatRecord(record))
+        return lines
+
+    def dump(self, outfile = None):
+        """Writes the records to outfile (default: the outfile of the
+        recorder, or sys.stderr)."""
+        if outfile is None:
+            outfile = self.outfile
+            if outfile is None:
+                outfile = sys.stderr
+        print('flight recorder: last %s events' % len(self.records),
+              file = outfile)
+        for line in self.lines():
+            print(line, file = outfile)
+
+
+def _name(obj):
+    if obj is None:
+        return None
+    return getattr(obj, 'name', None) or str(obj)
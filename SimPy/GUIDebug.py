@@ -59,20 +59,16 @@ class GUIController(object):
     def saveNextEvent(self):
         #from SimPy.SimulationTrace import _e
 
-        tempList=[]
-        tempList[:]=Globals.sim._timestamps
-        tempList.sort()
+        # only event notices which are not cancelled
+        tempList=Globals.sim._timestamps.notices()
 
         for ev in tempList:
 
-            # return only event notices which are not cancelled
-            if ev[3]: continue
-
             # save next event
             self.nextEvent = ev
             return
 
-        self.nextEvent = (None,None,None,None)
+        self.nextEvent = (None,None,None)
 
     def organizeWindows(self):
 
@@ -211,15 +207,14 @@ class EventWindow(GenericWindow):
         #from SimPy.SimulationStep import _e
         self.table.delete(0,self.table.size())
 
-        tempList=[]
-        tempList[:]=Globals.sim._timestamps
-        tempList.sort()
+        # only event notices which are not cancelled
+        tempList=Globals.sim._timestamps.notices()
 
         ev = self.guiCtrl.nextEvent
 
         nextLine = 0
         if( ev[2] ):
-            if( ev[2]._nextpoint ):
+            if( getattr(ev[2], '_nextpoint', None) ):
                 nextLine = ev[2]._nextpoint.gi_frame.f_lineno
 
         if ev[0]:
@@ -229,9 +224,6 @@ class EventWindow(GenericWindow):
         count = -1
         for ev in tempList:
 
-            # return only event notices which are not cancelled
-            if ev[3]: continue
-
             count += 1
 
             currentEvent = ''
@@ -240,7 +232,7 @@ class EventWindow(GenericWindow):
 
             nextLine = 0
             if( ev[2] ):
-                if( ev[2]._nextpoint ):
+                if( getattr(ev[2], '_nextpoint', None) ):
                     nextLine = ev[2]._nextpoint.gi_frame.f_lineno
 
             self.table.insert(END,(currentEvent,
@@ -345,14 +337,14 @@ class ResourceWindow(GenericWindow):
         self.activeT.delete(0,END)
         self.waitT.delete(0,END)
         # Update the activeQ
-        for i in range(len(self.resource.activeQ)):
+        for i, proc in enumerate(self.resource.activeQ):
             col1 = '%d' % (i+1)
-            col2 = self.resource.activeQ[i].name
+            col2 = proc.name
             self.activeT.insert(END,("   " + col1,col2))
         # Update the waitQ
-        for i in range(len(self.resource.waitQ)):
+        for i, proc in enumerate(self.resource.waitQ):
             col1 = '%d' % (i+1)
-            col2 = self.resource.waitQ[i].name
+            col2 = proc.name
             self.waitT.insert(END,("   " + col1,col2))
 
         self.activeT.pack(expand=YES,fill=BOTH)
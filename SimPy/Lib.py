@@ -1,13 +1,18 @@
 # coding=utf-8
 """
-This file contains Simerror, FatalSimerror, Process, SimEvent, the resources
-Resource, Level and Storage as well as their dependencies Buffer, Queue, FIFO
-and PriorityQ.
+This file contains Simerror, FatalSimerror, Process, SimEvent, the
+resources Resource, Level, Store, DequeStore, PriorityStore, KeyedStore (with
+ByKey) and Mailbox as well as their dependencies Buffer, Queue, FIFO,
+LinkedFIFO and PriorityQ.
 
 """
 import inspect
 import sys
 import types
+from bisect import bisect_left, bisect_right, insort
+from collections import OrderedDict, deque
+from heapq import heapify, heappop, heappush
+from itertools import islice
 
 from SimPy.Lister import Lister
 from SimPy.Recording import Monitor, Tally
@@ -30,8 +35,10 @@ class FatalSimerror(Simerror):
         Simerror.__init__(self, value)
         self.value = value
 
-class Process(Lister):
-    """Superclass of classes which may use generator functions"""
+class _ProcessBase(object):
+    """Behaviour of Process and LightProcess"""
+    __slots__ = ()
+
     def __init__(self, name = 'a_process', sim = None):
         if sim is None: sim = Globals.sim # Use global simulation object if sim is None
         self.sim = sim
@@ -43,18 +50,20 @@ class Process(Lister):
         else:
             raise FatalSimerror("Process name parameter '%s' is not a string"%name)
         self._nextTime = None #next activation time
+        # the live event notice of this process, if any
+        self._rec = None
         self._remainService = 0
         self._preempted = 0
-        self._priority={}
-        self._getpriority={}
-        self._putpriority={}
+        # Priorities of this process per Resource (request) and Buffer (get,
+        # put); created by the first resource or buffer which uses them
+        self._priority = None
+        self._getpriority = None
+        self._putpriority = None
         self._terminated = False
         self._inInterrupt = False
+        # Objects the condition of a 'yield waituntil' depends on, if declared
+        self._watched = None
         self.eventsFired = [] #which events process waited / queued for occurred
-        if hasattr(sim, 'trace'):
-            self._doTracing = True
-        else:
-            self._doTracing = False
 
     def active(self):
         return self._nextTime != None and not self._inInterrupt
@@ -102,9 +111,8 @@ class Process(Lister):
                 zeit = max(self.sim._t, at)
             else:
                 zeit = max(self.sim._t, self.sim._t + delay)
-            if self._doTracing:
-                self.sim.trace.recordActivate(who = self, when = zeit,
-                                               prior = prior)
+            if self.sim._hooks:
+                self.sim._notify('activate', self, zeit, prior)
             self.sim._post(what = self, at = zeit, prior = prior)
 
     def _hold(self, a):
@@ -128,17 +136,13 @@ class Process(Lister):
         """Application function to interrupt active processes"""
         # can't interrupt terminated / passive / interrupted process
         if victim.active():
-            if self._doTracing:
-                save = self.sim.trace._comment
-                self.sim.trace._comment = None
+            if self.sim._hooks:
+                self.sim._notify('interrupt', self, victim)
             victim.interruptCause = self  # self causes interrupt
             left = victim._nextTime - self.sim._t
             victim.interruptLeft = left   # time left in current 'hold'
             victim._inInterrupt = True
             self.sim.reactivate(victim)
-            if self._doTracing:
-                self.sim.trace._comment = save
-                self.sim.trace.recordInterrupt(self, victim)
             return left
         else: #victim not active -- can't interrupt
             return None
@@ -154,60 +158,115 @@ class Process(Lister):
         """Multi - functional test for reneging for 'request' and 'get':
         (1)If res of type Resource:
             Tests whether resource res was acquired when proces reactivated.
-            If yes, the parallel wakeup process is killed.
+            If yes, the renege timer is cancelled.
             If not, process is removed from res.waitQ (reneging).
         (2)If res of type Store:
             Tests whether item(s) gotten from Store res.
-            If yes, the parallel wakeup process is killed.
+            If yes, the renege timer is cancelled.
             If no, process is removed from res.getQ
         (3)If res of type Level:
             Tests whether units gotten from Level res.
-            If yes, the parallel wakeup process is killed.
+            If yes, the renege timer is cancelled.
             If no, process is removed from res.getQ.
         """
         if isinstance(res, Resource):
             test = self in res.activeQ
             if test:
-                self.cancel(self._holder)
+                self._holder.cancel()
             else:
                 res.waitQ.remove(self)
                 if res.monitored:
                     res.waitMon.observe(len(res.waitQ),t = self.sim.now())
+                if self.sim._hooks:
+                    self.sim._notify('leave', res.waitQ, self)
             return test
         elif isinstance(res, Store):
             test = len(self.got)
             if test:
-                self.cancel(self._holder)
+                self._holder.cancel()
             else:
                 res.getQ.remove(self)
                 if res.monitored:
                     res.getQMon.observe(len(res.getQ),t = self.sim.now())
+                if self.sim._hooks:
+                    self.sim._notify('leave', res.getQ, self)
             return test
         elif isinstance(res, Level):
             test = not (self.got is None)
             if test:
-                self.cancel(self._holder)
+                self._holder.cancel()
             else:
                 res.getQ.remove(self)
                 if res.monitored:
                     res.getQMon.observe(len(res.getQ),t = self.sim.now())
+                if self.sim._hooks:
+                    self.sim._notify('leave', res.getQ, self)
             return test
 
     def stored(self, buffer):
         """Test for reneging for 'yield put . . .' compound statement (Level and
         Store. Returns True if not reneged.
-        If self not in buffer.putQ, kill wakeup process, else take self out of
+        If self not in buffer.putQ, cancel renege timer, else take self out of
         buffer.putQ (reneged)"""
         test = self in buffer.putQ
         if test:    #reneged
             buffer.putQ.remove(self)
             if buffer.monitored:
                 buffer.putQMon.observe(len(buffer.putQ),t = self.sim.now())
+            if self.sim._hooks:
+                self.sim._notify('leave', buffer.putQ, self)
         else:
-            self.cancel(self._holder)
+            self._holder.cancel()
         return not test
 
 
+class Process(_ProcessBase, Lister):
+    """Superclass of classes which may use generator functions"""
+
+class LightProcess(_ProcessBase):
+    """Process without a per-instance __dict__, for models with very many
+    entities. Subclasses declare their own attributes in __slots__:
+
+    class Customer(LightProcess):
+        __slots__ = ('arrival',)
+
+    A LightProcess can use all yield commands, interrupt, cancel, acquired,
+    stored and the status methods like a Process. Attributes which are not
+    declared, including Watched attributes, need '__dict__' in __slots__.
+    """
+    __slots__ = ('sim', 'name', '_nextpoint', '_nextTime', '_remainService',
+                 '_preempted', '_priority', '_getpriority', '_putpriority',
+                 '_terminated', '_inInterrupt', '_watched', 'eventsFired',
+                 'interruptLeft', 'interruptCause', 'got', '_rec', '_holder',
+                 '_nrToGet', '_whatToPut', 'cond')
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.name)
+
+class Watched(object):
+    """Attribute whose changes are signalled to the Simulation, so that
+    'yield waituntil' conditions watching the owning object are re-tested:
+
+    class Car(Process):
+        speed = Watched(0)
+    ...
+    yield waituntil, self, lambda: car.speed > 50, car
+    """
+    def __init__(self, default = None):
+        self.default = default
+        self._key = '_watched%s' % id(self)
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        return getattr(instance, self._key, self.default)
+
+    def __set__(self, instance, value):
+        setattr(instance, self._key, value)
+        sim = getattr(instance, 'sim', None)
+        if sim is None: sim = Globals.sim
+        sim.changed(instance)
+
 class SimEvent(Lister):
     """Supports one - shot signalling between processes. All processes waiting for an event to occur
     get activated when its occurrence is signalled. From the processes queuing for an event, only
@@ -221,10 +280,6 @@ class SimEvent(Lister):
         self.queues = []
         self.occurred = False
         self.signalparam = None
-        if hasattr(sim, 'trace'):
-            self._doTracing = True
-        else:
-            self._doTracing = False
 
     def signal(self, param = None):
         """Produces a signal to self;
@@ -235,8 +290,8 @@ class SimEvent(Lister):
         have fired. (Cleanup queues of other events if wait was for an event - group (OR).)
         """
         self.signalparam = param
-        if self._doTracing:
-            self.sim.trace.recordSignal(self)
+        if self.sim._hooks:
+            self.sim._notify('signal', self)
         if not self.waits and not self.queues:
             self.occurred = True
         else:
@@ -366,10 +421,20 @@ class Queue(list):
     def leave(self):
         pass
 
+    def enterFront(self, obj):
+        """Puts a preempted process at the front of the queue"""
+        self.insert(0, obj)
+        if self.monit:
+            self.moni.observe(len(self),t = self.moni.sim.now())
+        if self.resource.sim._hooks:
+            self.resource.sim._notify('enter', self, obj)
+
     def takeout(self, obj):
         self.remove(obj)
         if self.monit:
             self.moni.observe(len(self), t = self.moni.sim.now())
+        if self.resource.sim._hooks:
+            self.resource.sim._notify('leave', self, obj)
 
 class FIFO(Queue):
     def __init__(self, res, moni):
@@ -379,6 +444,8 @@ class FIFO(Queue):
         self.append(obj)
         if self.monit:
             self.moni.observe(len(self),t = self.moni.sim.now())
+        if self.resource.sim._hooks:
+            self.resource.sim._notify('enter', self, obj)
 
     def enterGet(self, obj):
         self.enter(obj)
@@ -390,62 +457,277 @@ class FIFO(Queue):
         a = self.pop(0)
         if self.monit:
             self.moni.observe(len(self),t = self.moni.sim.now())
+        if self.resource.sim._hooks:
+            self.resource.sim._notify('leave', self, a)
         return a
 
+class LinkedFIFO(object):
+    """FIFO queue with constant-time enter, leave and removal of any queued
+    process (reneging), for long queues. It is read like a list (len,
+    indexing, iteration, in, comparison with a list); indexing other than
+    [0] and [-1] walks the queue.
+    """
+    def __init__(self, res, moni):
+        self.monit = moni is not None
+        self.moni = moni # The Monitor / Tally
+        self.resource = res # the resource / buffer this queue belongs to
+        # handle (sequence number) -> queued object, in queue order
+        self._items = OrderedDict()
+        # queued object -> its handle, or list of handles in queue order if
+        # it is queued more than once
+        self._handles = {}
+        self._seq = 0
+        # Handles of front entries count down from here
+        self._front = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __iter__(self):
+        return iter(self._items.values())
+
+    def __contains__(self, obj):
+        return obj in self._handles
+
+    def __getitem__(self, z):
+        if isinstance(z, slice):
+            return list(self)[z]
+        items = self._items
+        if z < 0:
+            z += len(items)
+        if not 0 <= z < len(items):
+            raise IndexError('queue index out of range')
+        if z == 0:
+            return items[next(iter(items))]
+        if z == len(items) - 1:
+            return items[next(reversed(items))]
+        return next(islice(self, z, None))
+
+    def __eq__(self, other):
+        if isinstance(other, (list, tuple, LinkedFIFO)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = object.__hash__
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def _add(self, obj, h):
+        """Records handle h of obj; front handles come first."""
+        self._items[h] = obj
+        handles = self._handles
+        old = handles.get(obj)
+        if old is None:
+            handles[obj] = h
+        elif type(old) is list:
+            if h < 0:
+                old.insert(0, h)
+            else:
+                old.append(h)
+        elif h < 0:
+            handles[obj] = [h, old]
+        else:
+            handles[obj] = [old, h]
+
+    def enter(self, obj):
+        self._seq += 1
+        self._add(obj, self._seq)
+        if self.monit:
+            self.moni.observe(len(self._items),t = self.moni.sim.now())
+        if self.resource.sim._hooks:
+            self.resource.sim._notify('enter', self, obj)
+
+    def enterGet(self, obj):
+        self.enter(obj)
+
+    def enterPut(self, obj):
+        self.enter(obj)
+
+    def enterFront(self, obj):
+        """Puts a preempted process at the front of the queue"""
+        self._front -= 1
+        h = self._front
+        self._add(obj, h)
+        items = self._items
+        if hasattr(items, 'move_to_end'):
+            items.move_to_end(h, last = False)
+        else:  # Python 2
+            del items[h]
+            self._items = OrderedDict([(h, obj)] + list(items.items()))
+        if self.monit:
+            self.moni.observe(len(self._items),t = self.moni.sim.now())
+        if self.resource.sim._hooks:
+            self.resource.sim._notify('enter', self, obj)
+
+    def remove(self, obj):
+        """Removes the first entry of obj."""
+        handles = self._handles
+        h = handles.get(obj)
+        if h is None:
+            raise ValueError('%s not in queue' % obj)
+        if type(h) is list:
+            hs = h
+            h = hs.pop(0)
+            if len(hs) == 1:
+                handles[obj] = hs[0]
+        else:
+            del handles[obj]
+        del self._items[h]
+
+    def leave(self):
+        a = self._items[next(iter(self._items))]
+        self.remove(a)
+        if self.monit:
+            self.moni.observe(len(self._items),t = self.moni.sim.now())
+        if self.resource.sim._hooks:
+            self.resource.sim._notify('leave', self, a)
+        return a
+
+    def takeout(self, obj):
+        self.remove(obj)
+        if self.monit:
+            self.moni.observe(len(self._items), t = self.moni.sim.now())
+        if self.resource.sim._hooks:
+            self.resource.sim._notify('leave', self, obj)
+
 class PriorityQ(FIFO):
     """Queue is always ordered according to priority.
     Higher value of priority attribute == higher priority.
+    Requests of equal priority are queued FIFO.
+
+    The queue can be read like a list. It is changed through its methods
+    (enter, enterGet, enterPut, enterFront, leave, takeout, remove and pop)
+    or by deleting entries; the list methods which would put entries out of
+    priority order (append, extend, insert, item assignment, sort, reverse,
+    += and *=) raise a TypeError.
     """
     def __init__(self, res, moni):
         FIFO.__init__(self, res, moni)
-
-    def enter(self, obj):
-        """Handles request queue for Resource"""
-        if len(self):
-            ix = self.resource
-            if self[-1]._priority[ix] >= obj._priority[ix]:
-                self.append(obj)
-            else:
-                z = 0
-                while self[z]._priority[ix] >= obj._priority[ix]:
-                    z += 1
-                self.insert(z, obj)
+        # Sort keys (-priority, sequence number) parallel to the list, and
+        # the key of each queued object, or the list of its keys in queue
+        # order if it is queued more than once
+        self._keys = []
+        self._key = {}
+        self._seq = 0
+        # Sequence numbers of front entries count down from here
+        self._front = 0
+
+    def _enter(self, obj, priority):
+        self._seq += 1
+        key = (-priority, self._seq)
+        keys = self._keys
+        if not keys or keys[-1] < key:
+            keys.append(key)
+            list.append(self, obj)
         else:
-            self.append(obj)
+            z = bisect_right(keys, key)
+            keys.insert(z, key)
+            list.insert(self, z, obj)
+        self._addKey(obj, key)
         if self.monit:
             self.moni.observe(len(self),t = self.moni.sim.now())
+        if self.resource.sim._hooks:
+            self.resource.sim._notify('enter', self, obj)
+
+    def enter(self, obj):
+        """Handles request queue for Resource"""
+        self._enter(obj, obj._priority[self.resource])
 
     def enterGet(self, obj):
         """Handles getQ in Buffer"""
-        if len(self):
-            ix = self.resource
-            if self[-1]._getpriority[ix] >= obj._getpriority[ix]:
-                self.append(obj)
-            else:
-                z = 0
-                while self[z]._getpriority[ix] >= obj._getpriority[ix]:
-                    z += 1
-                self.insert(z, obj)
-        else:
-            self.append(obj)
-        if self.monit:
-            self.moni.observe(len(self),t = self.moni.sim.now())
+        self._enter(obj, obj._getpriority[self.resource])
 
     def enterPut(self, obj):
         """Handles putQ in Buffer"""
-        if len(self):
-            ix = self.resource
-            if self[-1]._putpriority[ix] >= obj._putpriority[ix]:
-                self.append(obj)
-            else:
-                z = 0
-                while self[z]._putpriority[ix] >= obj._putpriority[ix]:
-                    z += 1
-                self.insert(z, obj)
-        else:
-            self.append(obj)
+        self._enter(obj, obj._putpriority[self.resource])
+
+    def enterFront(self, obj):
+        """Puts a preempted process at the front of the request queue of a
+        Resource, ahead of the requests of equal or lower priority entering
+        later."""
+        self._front -= 1
+        key = (-obj._priority[self.resource], self._front)
+        keys = self._keys
+        if keys and keys[0] < key:
+            key = (keys[0][0], self._front)
+        keys.insert(0, key)
+        list.insert(self, 0, obj)
+        self._addKey(obj, key)
         if self.monit:
             self.moni.observe(len(self),t = self.moni.sim.now())
+        if self.resource.sim._hooks:
+            self.resource.sim._notify('enter', self, obj)
+
+    def _addKey(self, obj, key):
+        """Records key of a new entry of obj."""
+        old = self._key.get(obj)
+        if old is None:
+            self._key[obj] = key
+        elif type(old) is list:
+            insort(old, key)
+        elif key < old:
+            self._key[obj] = [key, old]
+        else:
+            self._key[obj] = [old, key]
+
+    def _dropKey(self, obj, key):
+        """Forgets key of a removed entry of obj."""
+        old = self._key[obj]
+        if type(old) is list:
+            old.remove(key)
+            if len(old) == 1:
+                self._key[obj] = old[0]
+        else:
+            del self._key[obj]
+
+    def __contains__(self, obj):
+        return obj in self._key
+
+    def remove(self, obj):
+        """Removes the first entry of obj."""
+        key = self._key.get(obj)
+        if key is None:
+            raise ValueError('%s not in queue' % obj)
+        if type(key) is list:
+            key = key[0]
+        self._dropKey(obj, key)
+        z = bisect_left(self._keys, key)
+        del self._keys[z]
+        list.__delitem__(self, z)
+
+    def pop(self, z = -1):
+        self._dropKey(list.__getitem__(self, z), self._keys[z])
+        del self._keys[z]
+        return list.pop(self, z)
+
+    def __delitem__(self, z):
+        if isinstance(z, slice):
+            for obj, key in zip(list.__getitem__(self, z), self._keys[z]):
+                self._dropKey(obj, key)
+        else:
+            self._dropKey(list.__getitem__(self, z), self._keys[z])
+        del self._keys[z]
+        list.__delitem__(self, z)
+
+    def __delslice__(self, i, j):  # Python 2
+        self.__delitem__(slice(i, j))
+
+    def clear(self):
+        del self[:]
+
+    def _unordered(self, *args):
+        raise TypeError('%s is ordered by priority; use its enter methods'
+                        % self.__class__.__name__)
+
+    append = extend = insert = __setitem__ = __setslice__ = sort = reverse = \
+        __iadd__ = __imul__ = _unordered
 
 class Resource(Lister):
     """Models shared, limited capacity resources with queuing;
@@ -483,8 +765,20 @@ class Resource(Lister):
             monact = None
         self.waitQ = qType(self, monwait)
         self.preemptable = preemptable
-        self.activeQ = qType(self, monact)
+        # The processes holding units: ordered by priority if they can be
+        # preempted (the lowest priority last), so that the one to preempt
+        # is found directly; in a LinkedFIFO for FIFO resources, so that
+        # releasing a unit takes constant time.
+        if preemptable and not isinstance(self.waitQ, PriorityQ):
+            self.activeQ = PriorityQ(self, monact)
+        elif qType is FIFO:
+            self.activeQ = LinkedFIFO(self, monact)
+        else:
+            self.activeQ = qType(self, monact)
         self.priority_default = 0
+        # Whether the priorities of the requests are used
+        self._prioritized = bool(preemptable) or isinstance(self.waitQ,
+                                                            PriorityQ)
         # Initialize monitors
         if self.monitored:
             monact.observe(t = self.sim.now(), y = len(self.activeQ))
@@ -498,10 +792,13 @@ class Resource(Lister):
             if not (obj.sim == self.sim):
                 raise FatalSimerror("yield request: Process %s, Resource %s not in "\
                         "same Simulation instance"%(obj.name,self.name))
-        if len(arg[0]) == 4:        # yield request, self, resource, priority
-            obj._priority[self] = arg[0][3]
-        else:                       # yield request, self, resource
-            obj._priority[self] = self.priority_default
+        if self._prioritized:
+            if obj._priority is None:
+                obj._priority = {}
+            if len(arg[0]) == 4:    # yield request, self, resource, priority
+                obj._priority[self] = arg[0][3]
+            else:                   # yield request, self, resource
+                obj._priority[self] = self.priority_default
         if self.preemptable and self.n == 0: # No free resource
             # test for preemption condition
             preempt = obj._priority[self] > self.activeQ[-1]._priority[self]
@@ -515,14 +812,13 @@ class Resource(Lister):
                 if z._preempted == 1:
                     z._remainService = z._nextTime - self.sim._t
                     # cancel only at first preempt
-                    Process(sim=self.sim).cancel(z)
+                    self.sim._unpost(z)
                 # remove from activeQ
                 self.activeQ.remove(z)
+                if self.sim._hooks:
+                    self.sim._notify('leave', self.activeQ, z)
                 # put into front of waitQ
-                self.waitQ.insert(0, z)
-                # if self is monitored, update waitQ monitor
-                if self.monitored:
-                    self.waitMon.observe(len(self.waitQ), self.sim.now())
+                self.waitQ.enterFront(z)
                 # passivate re - queued process
                 z._nextTime = None
                 # assign resource unit to preemptor
@@ -542,12 +838,15 @@ class Resource(Lister):
                 self.n -= 1
                 self.activeQ.enter(obj)
                 self.sim._post(obj, at = self.sim._t, prior = 1)
+        self.sim.changed(self)
 
     def _release(self, arg):
         """Process release request for this resource"""
         actor = arg[1]
         self.n += 1
         self.activeQ.remove(arg[1])
+        if self.sim._hooks:
+            self.sim._notify('leave', self.activeQ, actor)
         if self.monitored:
             self.actMon.observe(len(self.activeQ),t = self.sim.now())
         #reactivate first waiting requestor if any; assign Resource to it
@@ -573,6 +872,7 @@ class Resource(Lister):
             else:
                 self.sim.reactivate(obj, delay = 0, prior = 1)
         self.sim._post(arg[1], at = self.sim._t, prior = 1)
+        self.sim.changed(self)
 
 class Buffer(Lister):
     """Abstract class for buffers
@@ -622,12 +922,29 @@ class Buffer(Lister):
             self.getQMon.observe(y = len(self.getQ),t = self.sim.now())
         self._putpriority={}
         self._getpriority={}
+        # Whether the priorities of puts and gets are used
+        self._putPrioritized = isinstance(self.putQ, PriorityQ)
+        self._getPrioritized = isinstance(self.getQ, PriorityQ)
 
         def _put(self):
             pass
         def _get(self):
             pass
 
+    def _setPutPriority(self, obj, priority):
+        """Records the priority of put requestor obj, if putQ uses it"""
+        if self._putPrioritized:
+            if obj._putpriority is None:
+                obj._putpriority = {}
+            obj._putpriority[self] = priority
+
+    def _setGetPriority(self, obj, priority):
+        """Records the priority of get requestor obj, if getQ uses it"""
+        if self._getPrioritized:
+            if obj._getpriority is None:
+                obj._getpriority = {}
+            obj._getpriority[self] = priority
+
 class Level(Buffer):
     """Models buffers for processes putting / getting un - distinguishable items.
     """
@@ -681,13 +998,13 @@ class Level(Buffer):
                         "put: Process %s, Level %s not in "\
                         "same Simulation instance"%(obj.name,self.name))
         if len(arg[0]) == 5:        # yield put, self, buff, whattoput, priority
-            obj._putpriority[self] = arg[0][4]
+            self._setPutPriority(obj, arg[0][4])
             whatToPut = arg[0][3]
         elif len(arg[0]) == 4:      # yield get, self, buff, whattoput
-            obj._putpriority[self] = Buffer.priorityDefault #default
+            self._setPutPriority(obj, Buffer.priorityDefault) #default
             whatToPut = arg[0][3]
         else:                       # yield get, self, buff
-            obj._putpriority[self] = Buffer.priorityDefault #default
+            self._setPutPriority(obj, Buffer.priorityDefault) #default
             whatToPut = 1
         if type(whatToPut) != type(1) and type(whatToPut) != type(1.0):
             raise FatalSimerror('Level: put parameter not a number')
@@ -717,6 +1034,7 @@ class Level(Buffer):
                 else:
                     break
             whichSim._post(obj, at = whichSim._t, prior = 1) # continue the put requestor
+        self.sim.changed(self)
 
     def _get(self, arg):
         """Handles get requests for Level instances"""
@@ -729,13 +1047,13 @@ class Level(Buffer):
                         "same Simulation instance"%(obj.name,self.name))
         obj.got = None
         if len(arg[0]) == 5:        # yield get, self, buff, whattoget, priority
-            obj._getpriority[self] = arg[0][4]
+            self._setGetPriority(obj, arg[0][4])
             nrToGet = arg[0][3]
         elif len(arg[0]) == 4:      # yield get, self, buff, whattoget
-            obj._getpriority[self] = Buffer.priorityDefault #default
+            self._setGetPriority(obj, Buffer.priorityDefault) #default
             nrToGet = arg[0][3]
         else:                       # yield get, self, buff
-            obj._getpriority[self] = Buffer.priorityDefault
+            self._setGetPriority(obj, Buffer.priorityDefault)
             nrToGet = 1
         if type(nrToGet) != type(1.0) and type(nrToGet) != type(1):
             raise FatalSimerror('Level: get parameter not a number: %s'%nrToGet)
@@ -765,6 +1083,7 @@ class Level(Buffer):
                     self.sim._post(proc, at = self.sim._t) # continue a blocked put requestor
                 else:
                     break
+        self.sim.changed(self)
 
 class Store(Buffer):
     """Models buffers for processes coupled by putting / getting distinguishable
@@ -796,7 +1115,7 @@ class Store(Buffer):
                    ('Store: number initialBuffered exceeds capacity')
             else:
                 ## buffer receives list of objects
-                self.theBuffer[:] = self.initialBuffered
+                self.theBuffer = list(self.initialBuffered)
         elif self.initialBuffered is None:
             self.theBuffer = []
         else:
@@ -824,6 +1143,87 @@ class Store(Buffer):
         self._sort = sortFunc.__get__(self, self.__class__)
         self.theBuffer = self._sort(self.theBuffer)
 
+    def _addItems(self, items):
+        """Adds items to the buffer"""
+        self.theBuffer.extend(items)
+        if not(self._sort is None):
+            self.theBuffer = self._sort(self.theBuffer)
+
+    def _takeItems(self, nrToGet):
+        """Removes the first nrToGet items from the buffer and returns them
+        as a list"""
+        got = self.theBuffer[:nrToGet]
+        del self.theBuffer[:nrToGet]
+        return got
+
+    def _takeFiltered(self, filtfunc):
+        """Removes the items chosen by filter function filtfunc from the
+        buffer and returns them as a list (empty if none were chosen)"""
+        movCand = filtfunc(self.theBuffer)
+        if not movCand:
+            return []
+        got = movCand[:]
+        for item in movCand:
+            self.theBuffer.remove(item)
+        return got
+
+    def _serveGetters(self):
+        """Serves waiting getters after a put"""
+        whichSim = self.sim
+        # service in queue order: do not serve second in queue before first
+        # has been served
+        #
+        # [jkoomen@xeroxlabs.com / 2011-08-16]
+        # Documentation says that
+        # "yield get requests with a numerical parameter are honored in priority/FIFO order"
+        # but
+        # "yield get requests with a filter function parameter are not necessarily honored in priority/FIFO order, but rather according to the filter function."
+#        while self.nrBuffered > 0 and len(self.getQ):
+        idx = 0
+        while self.nrBuffered > 0 and idx < len(self.getQ):
+            proc = self.getQ[idx]
+            if inspect.isfunction(proc._nrToGet):
+                got = self._takeFiltered(proc._nrToGet) #predicate parameter
+                if got:
+                    proc.got = got
+                    self.getQ.takeout(proc)
+                    if self.monitored:
+                        self.bufferMon.observe(
+                                y = self.nrBuffered, t = whichSim._t)
+                    whichSim._post(what = proc, at = whichSim._t) # continue a blocked get requestor
+                else:
+#                    break
+                    idx += 1
+            else: #numerical parameter
+                if proc._nrToGet <= self.nrBuffered:
+                    proc.got = self._takeItems(proc._nrToGet)
+                    if self.monitored:
+                        self.bufferMon.observe(
+                                   y = self.nrBuffered, t = whichSim._t)
+                    # take this get requestor's record out of queue:
+                    self.getQ.takeout(proc)
+                    whichSim._post(what = proc, at = whichSim._t) # continue a blocked get requestor
+                else:
+                    break
+
+    def _servePutters(self):
+        """Serves waiting putters after a get"""
+        whichSim = self.sim
+        # reactivate any put requestors for which space is now available
+        # serve in queue order: do not serve second in queue before first
+        # has been served
+        while len(self.putQ):
+            proc = self.putQ[0]
+            if len(proc._whatToPut) + self.nrBuffered <= self.capacity:
+                self._addItems(proc._whatToPut) #move items to buffer
+                if self.monitored:
+                    self.bufferMon.observe(
+                                y = self.nrBuffered, t = whichSim.now())
+                self.putQ.takeout(proc) # dequeue requestor's record
+                whichSim._post(proc, at = whichSim._t) # continue a blocked put requestor
+            else:
+                break
+
     def _put(self, arg):
         """Handles put requests for Store instances"""
         obj = arg[1]
@@ -835,10 +1235,10 @@ class Store(Buffer):
                                 "same Simulation instance"%(obj.name,self.name))
         whichSim=self.sim
         if len(arg[0]) == 5:        # yield put, self, buff, whattoput, priority
-            obj._putpriority[self] = arg[0][4]
+            self._setPutPriority(obj, arg[0][4])
             whatToPut = arg[0][3]
         elif len(arg[0]) == 4:      # yield put, self, buff, whattoput
-            obj._putpriority[self] = Buffer.priorityDefault #default
+            self._setPutPriority(obj, Buffer.priorityDefault) #default
             whatToPut = arg[0][3]
         else:                       # error, whattoput missing
             raise FatalSimerror('Item to put missing in yield put stmt')
@@ -850,55 +1250,13 @@ class Store(Buffer):
             obj._whatToPut = whatToPut
             self.putQ.enterPut(obj) #and queue, with items to put
         else:
-            self.theBuffer.extend(whatToPut)
-            if not(self._sort is None):
-                self.theBuffer = self._sort(self.theBuffer)
+            self._addItems(whatToPut)
             if self.monitored:
                 self.bufferMon.observe(y = self.nrBuffered, t = whichSim.now())
-
             # service any waiting getters
-            # service in queue order: do not serve second in queue before first
-            # has been served
-            #
-            # [jkoomen@xeroxlabs.com / 2011-08-16]
-            # Documentation says that
-            # "yield get requests with a numerical parameter are honored in priority/FIFO order"
-            # but
-            # "yield get requests with a filter function parameter are not necessarily honored in priority/FIFO order, but rather according to the filter function."
-#            while self.nrBuffered > 0 and len(self.getQ):
-            idx = 0
-            while self.nrBuffered > 0 and idx < len(self.getQ):
-                proc = self.getQ[idx]
-                if inspect.isfunction(proc._nrToGet):
-                    movCand = proc._nrToGet(self.theBuffer) #predicate parameter
-                    if movCand:
-                        proc.got = movCand[:]
-                        for i in movCand:
-                            self.theBuffer.remove(i)
-                        self.getQ.takeout(proc)
-                        if self.monitored:
-                            self.bufferMon.observe(
-                                    y = self.nrBuffered, t = whichSim._t)
-                        whichSim._post(what = proc, at = whichSim._t) # continue a blocked get requestor
-                    else:
-#                        break
-                        idx += 1
-                else: #numerical parameter
-                    if proc._nrToGet <= self.nrBuffered:
-                        nrToGet = proc._nrToGet
-                        proc.got = []
-                        proc.got[:] = self.theBuffer[0:nrToGet]
-                        self.theBuffer[:] = self.theBuffer[nrToGet:]
-                        if self.monitored:
-                            self.bufferMon.observe(
-                                       y = self.nrBuffered, t = whichSim._t)
-                        # take this get requestor's record out of queue:
-                        self.getQ.takeout(proc)
-                        whichSim._post(what = proc, at = whichSim._t) # continue a blocked get requestor
-                    else:
-                        break
-
+            self._serveGetters()
             whichSim._post(what = obj, at = whichSim._t, prior = 1) # continue the put requestor
+        self.sim.changed(self)
 
     def _get(self, arg):
         """Handles get requests"""
@@ -913,19 +1271,19 @@ class Store(Buffer):
         whichSim=obj.sim
         obj.got = []                  # the list of items retrieved by 'get'
         if len(arg[0]) == 5:        # yield get, self, buff, whattoget, priority
-            obj._getpriority[self] = arg[0][4]
+            self._setGetPriority(obj, arg[0][4])
             if inspect.isfunction(arg[0][3]):
                 filtfunc = arg[0][3]
             else:
                 nrToGet = arg[0][3]
         elif len(arg[0]) == 4:      # yield get, self, buff, whattoget
-            obj._getpriority[self] = Buffer.priorityDefault #default
+            self._setGetPriority(obj, Buffer.priorityDefault) #default
             if inspect.isfunction(arg[0][3]):
                 filtfunc = arg[0][3]
             else:
                 nrToGet = arg[0][3]
         else:                       # yield get, self, buff
-            obj._getpriority[self] = Buffer.priorityDefault
+            self._setGetPriority(obj, Buffer.priorityDefault)
             nrToGet = 1
         if not filtfunc: #number specifies nr items to get
             if nrToGet < 0:
@@ -937,57 +1295,382 @@ class Store(Buffer):
                 # passivate / block queuing 'get' process
                 obj._nextTime = None
             else:
-                for i in range(nrToGet):
-                    obj.got.append(self.theBuffer.pop(0)) # move items from
-                                                # buffer to requesting process
+                # move items from buffer to requesting process
+                obj.got = self._takeItems(nrToGet)
                 if self.monitored:
                     self.bufferMon.observe(y = self.nrBuffered, t = whichSim.now())
                 whichSim._post(obj, at = whichSim._t, prior = 1)
-                # reactivate any put requestors for which space is now available
-                # serve in queue order: do not serve second in queue before first
-                # has been served
-                while len(self.putQ):
-                    proc = self.putQ[0]
-                    if len(proc._whatToPut) + self.nrBuffered <= self.capacity:
-                        for i in proc._whatToPut:
-                            self.theBuffer.append(i) #move items to buffer
-                        if not(self._sort is None):
-                            self.theBuffer = self._sort(self.theBuffer)
-                        if self.monitored:
-                            self.bufferMon.observe(
-                                        y = self.nrBuffered, t = whichSim.now())
-                        self.putQ.takeout(proc) # dequeue requestor's record
-                        whichSim._post(proc, at = whichSim._t) # continue a blocked put requestor
-                    else:
-                        break
+                self._servePutters()
         else: # items to get determined by filtfunc
-            movCand = filtfunc(self.theBuffer)
-            if movCand: # get succeded
+            got = self._takeFiltered(filtfunc)
+            if got: # get succeded
                 whichSim._post(obj, at = whichSim._t, prior = 1)
-                obj.got = movCand[:]
-                for item in movCand:
-                    self.theBuffer.remove(item)
+                obj.got = got
                 if self.monitored:
                     self.bufferMon.observe(y = self.nrBuffered, t = whichSim.now())
-                # reactivate any put requestors for which space is now available
-                # serve in queue order: do not serve second in queue before first
-                # has been served
-                while len(self.putQ):
-                    proc = self.putQ[0]
-                    if len(proc._whatToPut) + self.nrBuffered <= self.capacity:
-                        for i in proc._whatToPut:
-                            self.theBuffer.append(i) #move items to buffer
-                        if not(self._sort is None):
-                            self.theBuffer = self._sort(self.theBuffer)
-                        if self.monitored:
-                            self.bufferMon.observe(
-                                        y = self.nrBuffered, t = whichSim.now())
-                        self.putQ.takeout(proc) # dequeue requestor's record
-                        whichSim._post(proc, at = whichSim._t) # continue a blocked put requestor
-                    else:
-                        break
+                self._servePutters()
             else: # get did not succeed, block
                 obj._nrToGet = filtfunc
                 self.getQ.enterGet(obj)
                 # passivate / block queuing 'get' process
                 obj._nextTime = None
+        self.sim.changed(self)
+
+class _ItemDeque(deque):
+    """The buffer of a DequeStore, read like a list: slicing gives a list,
+    and it compares equal to a list of the same items."""
+    def __getitem__(self, z):
+        if isinstance(z, slice):
+            return list(self)[z]
+        return deque.__getitem__(self, z)
+
+    def __eq__(self, other):
+        if isinstance(other, list):
+            return list(self) == other
+        return deque.__eq__(self, other)
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+    def __repr__(self):
+        return repr(list(self))
+
+class DequeStore(Store):
+    """Store for long buffers: the items are kept in a deque, so putting
+    items and getting them in FIFO order take constant time per item,
+    however many items are buffered. theBuffer is read like a list (len,
+    indexing, slicing, iteration, comparison with a list), so gets with a
+    filter function work as for Store. A DequeStore cannot be sorted.
+    """
+    def __init__(self, **pars):
+        Store.__init__(self, **pars)
+        self.theBuffer = _ItemDeque(self.theBuffer)
+
+    def addSort(self, sortFunc):
+        raise FatalSimerror('DequeStore: buffer cannot be sorted, use Store')
+
+    def _addItems(self, items):
+        self.theBuffer.extend(items)
+
+    def _takeItems(self, nrToGet):
+        popleft = self.theBuffer.popleft
+        return [popleft() for i in range(nrToGet)]
+
+class Mailbox(DequeStore):
+    """Messages for a process: deliver(message), a method which can be
+    called from any code, wakes the first waiting receiver at once, and
+    'yield get, self, mailbox' receives the oldest message as self.got ==
+    [message]; both take constant time. A receive with a timeout is
+    'yield (get, self, mailbox), (hold, self, timeout)' followed by
+    self.acquired(mailbox). If monitored, bufferMon records the number of
+    messages, as for a Store.
+    """
+    def __init__(self, **pars):
+        if pars.get('name') is None:
+            pars['name'] = 'a_mailbox'
+        DequeStore.__init__(self, **pars)
+
+    def deliver(self, message):
+        """Puts message into the mailbox and wakes a waiting receiver"""
+        if self.nrBuffered >= self.capacity:
+            raise FatalSimerror('deliver: Mailbox %s is full' % self.name)
+        self._addItems((message,))
+        if self.monitored:
+            self.bufferMon.observe(y = self.nrBuffered, t = self.sim._t)
+        if len(self.getQ):
+            self._serveGetters()
+        self.sim.changed(self)
+
+class _SortKey(object):
+    """Key of an item of a PriorityStore ordered by a sort function: item
+    a comes before item b if the sort function puts a before b."""
+    __slots__ = ('item', 'sort')
+    def __init__(self, item, sort):
+        self.item = item
+        self.sort = sort
+
+    def __lt__(self, other):
+        return self.sort([other.item, self.item])[0] is self.item
+
+    def __eq__(self, other):
+        return not (self < other or other < self)
+
+    def __ne__(self, other):
+        return not self == other
+
+    __hash__ = None
+
+class PriorityStore(Store):
+    """Store keeping its items in a heap ordered by key(item) (by the items
+    themselves if key is None): the item with the smallest key is got
+    first, items with equal keys in FIFO order. A put or get takes
+    O(log n) time per item. theBuffer is a list of the items in this
+    order, built when read. addSort is supported for compatibility with
+    sorted Stores: the sort function is then only called on pairs of items.
+    Without key, items which cannot be compared can only be put after
+    addSort.
+    """
+    def __init__(self, key = None, **pars):
+        self.key = key
+        # (key, sequence number, item)
+        self._heap = []
+        self._seq = 0
+        Store.__init__(self, **pars)
+
+    def getnrBuffered(self):
+        return len(self._heap)
+    nrBuffered = property(getnrBuffered)
+
+    def gettheBuffer(self):
+        return [entry[2] for entry in sorted(self._heap)]
+
+    def settheBuffer(self, items):
+        self._heap = []
+        self._addItems(items)
+    theBuffer = property(gettheBuffer, settheBuffer)
+    buffered = property(gettheBuffer)
+
+    def addSort(self, sortFunc):
+        """Orders the items as sortFunc (see Store.addSort) sorts them."""
+        self._sort = sort = sortFunc.__get__(self, self.__class__)
+        self.key = lambda item: _SortKey(item, sort)
+        self.theBuffer = self.theBuffer
+
+    def _addItems(self, items):
+        heap = self._heap
+        key = self.key
+        for item in items:
+            self._seq += 1
+            if key is None:
+                heappush(heap, (item, self._seq, item))
+            else:
+                heappush(heap, (key(item), self._seq, item))
+
+    def _takeItems(self, nrToGet):
+        heap = self._heap
+        return [heappop(heap)[2] for i in range(nrToGet)]
+
+    def _takeFiltered(self, filtfunc):
+        entries = sorted(self._heap)
+        items = [entry[2] for entry in entries]
+        movCand = filtfunc(items[:])
+        if not movCand:
+            return []
+        got = movCand[:]
+        for item in movCand:
+            i = items.index(item)
+            del items[i]
+            del entries[i]
+        # A sorted list is a heap
+        self._heap = entries
+        return got
+
+class ByKey(object):
+    """What to get from a KeyedStore: one item with one of the given keys,
+    as in 'yield get, self, store, ByKey(key1, key2)'."""
+    __slots__ = ('keys',)
+    def __init__(self, *keys):
+        if not keys:
+            raise FatalSimerror('ByKey: no key given')
+        self.keys = keys
+
+    def __repr__(self):
+        return 'ByKey(%s)' % ', '.join([repr(k) for k in self.keys])
+
+class KeyedStore(Store):
+    """Store whose items are indexed by key(item) (the items themselves if
+    key is None). A get with ByKey takes the oldest item with one of the
+    keys, in constant time per key; a getter waiting with ByKey gets an
+    item of its key as soon as it is put, in constant expected time, before
+    getters waiting for a number of items or with a filter function. Those
+    are served as by a Store. getQ is a LinkedFIFO unless getQType is given;
+    getters waiting for the same key are served in FIFO order. A KeyedStore
+    cannot be sorted.
+    """
+    def __init__(self, key = None, **pars):
+        self.key = key
+        # sequence number -> (key, item), oldest first
+        self._items = OrderedDict()
+        # key -> deque of the sequence numbers of its items
+        self._byKey = {}
+        self._seq = 0
+        # key -> deque of (process, ticket) waiting for it; the entry is
+        # stale unless the process is in getQ with _nrToGet ticket
+        self._waiting = {}
+        # processes which waited for a number of items or with a filter
+        self._unkeyed = set()
+        pars.setdefault('getQType', LinkedFIFO)
+        Store.__init__(self, **pars)
+
+    def getnrBuffered(self):
+        return len(self._items)
+    nrBuffered = property(getnrBuffered)
+
+    def gettheBuffer(self):
+        return [entry[1] for entry in self._items.values()]
+
+    def settheBuffer(self, items):
+        self._items.clear()
+        self._byKey.clear()
+        self._addItems(items)
+    theBuffer = property(gettheBuffer, settheBuffer)
+    buffered = property(gettheBuffer)
+
+    def addSort(self, sortFunc):
+        raise FatalSimerror('KeyedStore: buffer cannot be sorted, use Store')
+
+    def _waiter(self, k):
+        """Returns the first process waiting for key k, or None"""
+        waiting = self._waiting.get(k)
+        if waiting is None:
+            return None
+        getQ = self.getQ
+        proc = None
+        while waiting:
+            proc, ticket = waiting.popleft()
+            if proc._nrToGet is ticket and proc in getQ:
+                break
+            proc = None
+        if not waiting:
+            del self._waiting[k]
+        return proc
+
+    def _addItems(self, items):
+        key = self.key
+        whichSim = self.sim
+        for item in items:
+            if key is None:
+                k = item
+            else:
+                k = key(item)
+            if self._waiting:
+                proc = self._waiter(k)
+                if proc is not None:
+                    # directly to the waiting getter
+                    proc.got = [item]
+                    self.getQ.takeout(proc)
+                    whichSim._post(what = proc, at = whichSim._t)
+                    continue
+            self._seq += 1
+            self._items[self._seq] = (k, item)
+            try:
+                self._byKey[k].append(self._seq)
+            except KeyError:
+                self._byKey[k] = deque((self._seq,))
+
+    def _remove(self, k, seq):
+        """Removes the item with key k and sequence number seq"""
+        del self._items[seq]
+        seqs = self._byKey[k]
+        if seqs[0] == seq:
+            seqs.popleft()
+        else:
+            seqs.remove(seq)
+        if not seqs:
+            del self._byKey[k]
+
+    def _takeItems(self, nrToGet):
+        got = []
+        items = self._items
+        for i in range(nrToGet):
+            seq = next(iter(items))
+            k, item = items[seq]
+            self._remove(k, seq)
+            got.append(item)
+        return got
+
+    def _takeFiltered(self, filtfunc):
+        movCand = filtfunc(self.theBuffer)
+        if not movCand:
+            return []
+        got = movCand[:]
+        for item in movCand:
+            for seq, (k, buffered) in self._items.items():
+                if buffered == item:
+                    self._remove(k, seq)
+                    break
+            else:
+                raise ValueError('item chosen by filter not in buffer')
+        return got
+
+    def _serveGetters(self):
+        # getters waiting with ByKey have been served by _addItems
+        if not self._unkeyed:
+            return
+        getQ = self.getQ
+        self._unkeyed = set([proc for proc in self._unkeyed
+                             if proc in getQ and not
+                             isinstance(proc._nrToGet, list)])
+        whichSim = self.sim
+        for proc in list(getQ):
+            if not self.nrBuffered:
+                break
+            if not proc in self._unkeyed:
+                continue
+            if inspect.isfunction(proc._nrToGet):
+                got = self._takeFiltered(proc._nrToGet)
+                if not got:
+                    continue
+            elif proc._nrToGet <= self.nrBuffered:
+                got = self._takeItems(proc._nrToGet)
+            else:
+                break
+            proc.got = got
+            self._unkeyed.discard(proc)
+            getQ.takeout(proc)
+            if self.monitored:
+                self.bufferMon.observe(y = self.nrBuffered, t = whichSim._t)
+            whichSim._post(what = proc, at = whichSim._t)
+
+    def _get(self, arg):
+        """Handles get requests, with ByKey or as Store"""
+        obj = arg[1]
+        if len(arg[0]) < 4 or not isinstance(arg[0][3], ByKey):
+            Store._get(self, arg)
+            if obj._nextTime is None:
+                self._unkeyed.add(obj)
+            return
+        # test that process and Store belong to same Simulation instance
+        if __debug__:
+            if not (obj.sim == self.sim):
+                raise FatalSimerror(
+                                "get: Process %s, Store %s not in "\
+                                "same Simulation instance"%(obj.name,self.name))
+        whichSim = obj.sim
+        obj.got = []
+        if len(arg[0]) == 5:        # yield get, self, buff, ByKey(...), priority
+            self._setGetPriority(obj, arg[0][4])
+        else:
+            self._setGetPriority(obj, Buffer.priorityDefault)
+        keys = arg[0][3].keys
+        # the oldest item with one of the keys
+        found = None
+        for k in keys:
+            seqs = self._byKey.get(k)
+            if seqs and (found is None or seqs[0] < found[1]):
+                found = (k, seqs[0])
+        if found is None:
+            # a fresh ticket, so that older entries of obj become stale
+            obj._nrToGet = ticket = [keys]
+            self.getQ.enterGet(obj)
+            for k in keys:
+                try:
+                    self._waiting[k].append((obj, ticket))
+                except KeyError:
+                    self._waiting[k] = deque(((obj, ticket),))
+            # passivate / block queuing 'get' process
+            obj._nextTime = None
+        else:
+            k, seq = found
+            obj.got = [self._items[seq][1]]
+            self._remove(k, seq)
+            if self.monitored:
+                self.bufferMon.observe(y = self.nrBuffered, t = whichSim._t)
+            whichSim._post(obj, at = whichSim._t, prior = 1)
+            self._servePutters()
+        self.sim.changed(self)
@@ -0,0 +1,82 @@
+# coding=utf-8
+"""
+This file contains Profile, the statistics collected by a Simulation while
+profiling is switched on with Simulation.startProfiling.
+
+"""
+from __future__ import print_function
+
+import sys
+import time
+
+# Wall clock with the best resolution available
+try:
+    clock = time.perf_counter
+except AttributeError:  # Python 2
+    clock = time.time
+
+
+class Profile(object):
+    """Wall-clock profile of a Simulation run. Collects per PEM (generator
+    function of a Process class) and per yield command the number of calls
+    and the time spent in them, as well as the number of events, the largest
+    number of event notices in the event list and the largest share of
+    cancelled notices in it.
+    """
+    def __init__(self, sim):
+        self.sim = sim
+        # (Process class, code of PEM) -> [calls, seconds]
+        self.pems = {}
+        # yield command word -> [calls, seconds]
+        self.commands = {}
+        self.events = 0
+        # Seconds spent in Simulation.step
+        self.wallTime = 0.0
+        self.maxNotices = 0
+        self.maxCancelledRatio = 0.0
+
+    def eventsPerSecond(self):
+        """Returns the number of events executed per second of wall time."""
+        if not self.wallTime:
+            return 0.0
+        return self.events / self.wallTime
+
+    def pemStats(self):
+        """Returns a list of (PEM name, calls, seconds), most expensive
+        first.
+        """
+        stats = []
+        for (cls, code), (calls, seconds) in self.pems.items():
+            if code is None:
+                name = cls.__name__
+            else:
+                name = '%s.%s' % (cls.__name__, code.co_name)
+            stats.append((name, calls, seconds))
+        stats.sort(key = lambda s: -s[2])
+        return stats
+
+    def commandStats(self):
+        """Returns a list of (command, calls, seconds), most expensive first.
+        """
+        stats = [(command, calls, seconds) for command, (calls, seconds)
+                 in self.commands.items()]
+        stats.sort(key = lambda s: -s[2])
+        return stats
+
+    def report(self, outfile = None):
+        """Prints the profile to outfile (default: sys.stdout)."""
+        if outfile is None:
+            outfile = sys.stdout
+        print('%s events in %.3f s: %.0f events/s' % (
+              self.events, self.wallTime, self.eventsPerSecond()),
+              file = outfile)
+        print('event notices: at most %s, at most %.1f%% cancelled' % (
+              self.maxNotices, 100 * self.maxCancelledRatio), file = outfile)
+        for title, stats in (('PEM', self.pemStats()),
+                             ('command', self.commandStats())):
+            print('%-40s %10s %10s %10s' % (title, 'calls', 'seconds',
+                                             'us/call'), file = outfile)
+            for name, calls, seconds in stats:
+                print('%-40s %10s %10.4f %10.2f' % (
+                      name, calls, seconds, 1e6 * seconds / calls),
+                      file = outfile)
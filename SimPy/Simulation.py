@@ -9,12 +9,16 @@ Based on generators
 import random
 import sys
 import types
-from heapq import heappush, heappop
+from itertools import chain, islice
 
 from SimPy.Lister import Lister
 from SimPy.Recording import Monitor, Tally
+from SimPy.EventList import EventList, HeapEventList, CalendarQueue
+from SimPy.Profiler import Profile, clock
 from SimPy.Lib import Process, SimEvent, PriorityQ, Resource, Level, \
-                      Store, Simerror, FatalSimerror, FIFO
+                      Store, DequeStore, PriorityStore, KeyedStore, ByKey, \
+                      Mailbox, Simerror, FatalSimerror, FIFO, LinkedFIFO, \
+                      Watched, LightProcess
 
 # Required for backward compatibility
 import SimPy
@@ -42,6 +46,121 @@ class Infinity(object):
 
 infinity = Infinity()
 
+class Timer(object):
+    """Cancellable callback in the event list of a Simulation. When its event
+    notice comes up, the Simulation calls callback(timer, *args). A Timer
+    can also wait for SimEvents like a process; it fires when they do.
+    Used for the renege conditions of compound yields.
+
+    The Timers of Simulation.schedule have a name (or the callback to take
+    it from) and call callback(*args) instead.
+    """
+    __slots__ = ('sim', 'callback', 'args', 'eventsFired', '_rec',
+                 '_nextTime', '_terminated', '_name', '__weakref__')
+
+    def __init__(self, sim, callback, *args):
+        self.sim = sim
+        self.callback = callback
+        self.args = args
+        self.eventsFired = None
+        self._rec = None
+        self._nextTime = None
+        self._terminated = False
+        self._name = None
+
+    def getname(self):
+        name = self._name
+        if name is not None:
+            if callable(name):
+                # a scheduled call named after its callback
+                return getattr(name, '__name__', None) or str(name)
+            return name
+        return 'timer for %s' % (self.args and getattr(self.args[0], 'name',
+                                                      self.args[0]))
+    name = property(getname)
+
+    def cancel(self):
+        """Cancels the timer, whether it is scheduled or waits for events."""
+        self.callback = None
+        self.sim._unpost(self)
+
+    def _fire(self):
+        self._nextTime = None
+        if self.callback is not None:
+            if self._name is None:
+                self.callback(self, *self.args)
+            else:
+                # a scheduled call
+                if self.sim._hooks:
+                    self.sim._notify('call', self)
+                self.callback(*self.args)
+
+class Arrivals(object):
+    """Entities arriving at given times, activated without a source process
+    (see Simulation.scheduleArrivals). A single Timer carries the event
+    notice of the next arrival.
+    """
+    __slots__ = ('sim', 'factory', 'times', 'interarrival', 'count',
+                 'nrArrived', 'timer')
+
+    # NumPy arrays are converted to floats this many at a time
+    chunkSize = 4096
+
+    def __init__(self, sim, factory, times = None, interarrival = None,
+                 count = None, name = 'arrivals'):
+        self.sim = sim
+        self.factory = factory
+        self.interarrival = interarrival
+        self.count = count
+        self.nrArrived = 0
+        if times is not None:
+            if hasattr(times, 'tolist'):
+                array = times
+                n = self.chunkSize
+                times = chain.from_iterable(
+                        array[i:i + n].tolist()
+                        for i in range(0, len(array), n))
+            times = iter(times)
+            if count is not None:
+                times = islice(times, count)
+        self.times = times
+        self.timer = Timer(sim, self._arrive)
+        self.timer._name = name
+
+    def getname(self):
+        return self.timer.name
+    name = property(getname)
+
+    def cancel(self):
+        """Stops the arrivals."""
+        self.timer.cancel()
+
+    def _arrive(self):
+        # The order of a source process: create and activate the entity, then
+        # hold until the next arrival
+        sim = self.sim
+        obj, pem = self.factory(self.nrArrived)
+        sim.activate(obj, pem)
+        self.nrArrived += 1
+        if self.times is not None:
+            at = next(self.times, None)
+            if at is not None:
+                if at < sim._t:
+                    _unorderedArrival(at, sim._t)
+                sim._post(self.timer, at)
+        else:
+            delay = self.interarrival()
+            if self.count is None or self.nrArrived < self.count:
+                sim._post(self.timer, sim._t + delay)
+
+def _pastArrival(at, now):
+    raise FatalSimerror('scheduleArrivals: times starts at %s, before now() '
+                        '(%s)' % (at, now))
+
+def _unorderedArrival(at, last):
+    raise FatalSimerror('scheduleArrivals: times is not ascending: %s comes '
+                        'after %s' % (at, last))
+
 def holdfunc(a):
     a[0][1]._hold(a)
 
@@ -59,45 +178,7 @@ def requestfunc(a):
         ##a[1] is the Process instance
         b[2]._request(arg = (b, a[1]))
         ##deal with add - on condition to command
-        ##Trigger processes for reneging
-        class _Holder(Process):
-            """Provides timeout process"""
-            def __init__(self,name,sim=None):
-                Process.__init__(self,name=name,sim=sim)
-            def trigger(self, delay):
-                yield hold, self, delay
-                if not proc in b[2].activeQ:
-                    proc.sim.reactivate(proc)
-
-        class _EventWait(Process):
-            """Provides event waiting process"""
-            def __init__(self,name,sim=None):
-                Process.__init__(self,name=name,sim=sim)
-            def trigger(self, event):
-                yield waitevent, self, event
-                if not proc in b[2].activeQ:
-                    proc.eventsFired = self.eventsFired
-                    proc.sim.reactivate(proc)
-
-        #activate it
-        proc = a[0][0][1] # the process to be woken up
-        actCode = a[0][1][0]
-        if actCode == hold:
-            proc._holder = _Holder(name = 'RENEGE - hold for %s'%proc.name,
-                                   sim=proc.sim)
-            ##                                          the timeout delay
-            proc.sim.activate(proc._holder, proc._holder.trigger(a[0][1][2]))
-        elif actCode == waituntil:
-            raise FatalSimerror('Illegal code for reneging: waituntil')
-        elif actCode == waitevent:
-            proc._holder = _EventWait(name = 'RENEGE - waitevent for %s'\
-                                      %proc.name,sim=proc.sim)
-            ##                                          the event
-            proc.sim.activate(proc._holder, proc._holder.trigger(a[0][1][2]))
-        elif actCode == queueevent:
-            raise FatalSimerror('Illegal code for reneging: queueevent')
-        else:
-            raise FatalSimerror('Illegal code for reneging %s'%actCode)
+        _renegeTimer(a, _renegeRequest)
     else:
         ## Simple yield request command
         a[0][2]._request(a)
@@ -129,7 +210,10 @@ def queueevfunc(a):
         evtpar[0]._queueOR(a)
 
 def waituntilfunc(par):
-    par[0][1].sim._waitUntilFunc(par[0][1], par[0][2])
+    if len(par[0]) == 4:            # yield waituntil, self, cond, watched
+        par[0][1].sim._waitUntilFunc(par[0][1], par[0][2], par[0][3])
+    else:                           # yield waituntil, self, cond
+        par[0][1].sim._waitUntilFunc(par[0][1], par[0][2])
 
 def getfunc(a):
     """Handles 'yield get, self, buffer, what, priority' and
@@ -145,46 +229,7 @@ def getfunc(a):
         ##a[1] is the Process instance
         b[2]._get(arg = (b, a[1]))
         ##deal with add - on condition to command
-        ##Trigger processes for reneging
-        class _Holder(Process):
-            """Provides timeout process"""
-            def __init__(self,**par):
-                Process.__init__(self,**par)
-            def trigger(self, delay):
-                yield hold, self, delay
-                #if not proc in b[2].activeQ:
-                if proc in b[2].getQ:
-                    a[1].sim.reactivate(proc)
-
-        class _EventWait(Process):
-            """Provides event waiting process"""
-            def __init__(self,**par):
-                Process.__init__(self,**par)
-            def trigger(self, event):
-                yield waitevent, self, event
-                if proc in b[2].getQ:
-                    a[1].eventsFired = self.eventsFired
-                    a[1].sim.reactivate(proc)
-
-        #activate it
-        proc = a[0][0][1] # the process to be woken up
-        actCode = a[0][1][0]
-        if actCode == hold:
-            proc._holder = _Holder(name='RENEGE - hold for %s'%proc.name,
-                                   sim=proc.sim)
-            ##                                          the timeout delay
-            a[1].sim.activate(proc._holder, proc._holder.trigger(a[0][1][2]))
-        elif actCode == waituntil:
-            raise FatalSimerror('waituntil: Illegal code for reneging: waituntil')
-        elif actCode == waitevent:
-            proc._holder = _EventWait(name="RENEGE - waitevent for%s"\
-                                      %proc.name,sim=proc.sim)
-            ##                                          the event
-            a[1].sim.activate(proc._holder, proc._holder.trigger(a[0][1][2]))
-        elif actCode == queueevent:
-            raise FatalSimerror('Illegal code for reneging: queueevent')
-        else:
-            raise FatalSimerror('Illegal code for reneging %s'%actCode)
+        _renegeTimer(a, _renegeGet)
     else:
         ## Simple yield request command
         a[0][2]._get(a)
@@ -202,50 +247,184 @@ def putfunc(a):
         ##a[1] is the Process instance
         b[2]._put(arg = (b, a[1]))
         ##deal with add - on condition to command
-        ##Trigger processes for reneging
-        class _Holder(Process):
-            """Provides timeout process"""
-            def __init__(self,**par):
-                Process.__init__(self,**par)
-            def trigger(self, delay):
-                yield hold, self, delay
-                #if not proc in b[2].activeQ:
-                if proc in b[2].putQ:
-                    a[1].sim.reactivate(proc)
-
-        class _EventWait(Process):
-            """Provides event waiting process"""
-            def __init__(self,**par):
-                Process.__init__(self,**par)
-            def trigger(self, event):
-                yield waitevent, self, event
-                if proc in b[2].putQ:
-                    a[1].eventsFired = self.eventsFired
-                    a[1].sim.reactivate(proc)
-
-        #activate it
-        proc = a[0][0][1] # the process to be woken up
-        actCode = a[0][1][0]
-        if actCode == hold:
-            proc._holder = _Holder(name='RENEGE - hold for %s'%proc.name,
-                                   sim=proc.sim)
-            ##                                          the timeout delay
-            a[1].sim.activate(proc._holder, proc._holder.trigger(a[0][1][2]))
-        elif actCode == waituntil:
-            raise FatalSimerror('Illegal code for reneging: waituntil')
-        elif actCode == waitevent:
-            proc._holder = _EventWait(name='RENEGE - waitevent for %s'\
-                                      %proc.name,sim=proc.sim)
-            ##                                          the event
-            a[1].sim.activate(proc._holder, proc._holder.trigger(a[0][1][2]))
-        elif actCode == queueevent:
-            raise FatalSimerror('Illegal code for reneging: queueevent')
-        else:
-            raise FatalSimerror('Illegal code for reneging %s'%actCode)
+        _renegeTimer(a, _renegePut)
     else:
         ## Simple yield request command
         a[0][2]._put(a)
 
+def _renegeTimer(a, callback):
+    """Attaches a Timer for the renege condition (<code>, self, par) of the
+    compound yield a to the requesting process. It calls
+    callback(timer, proc, res) when the delay has passed or the event(s)
+    fired.
+    """
+    proc = a[0][0][1] # the process to be woken up
+    res = a[0][0][2]
+    actCode = a[0][1][0]
+    sim = proc.sim
+    if actCode == hold:
+        delay = a[0][1][2]
+        if delay < 0:
+            raise FatalSimerror('hold: delay time negative: %s, in %s' % (
+                                 delay, proc))
+        proc._holder = Timer(sim, callback, proc, res)
+        sim._post(proc._holder, at = sim._t + delay)
+    elif actCode == waitevent:
+        proc._holder = timer = Timer(sim, callback, proc, res)
+        ## the timer waits for the event(s) like a process
+        waitevfunc(((waitevent, timer, a[0][1][2]), timer))
+    elif actCode == waituntil:
+        raise FatalSimerror('Illegal code for reneging: waituntil')
+    elif actCode == queueevent:
+        raise FatalSimerror('Illegal code for reneging: queueevent')
+    else:
+        raise FatalSimerror('Illegal code for reneging %s'%actCode)
+
+def _renegeRequest(timer, proc, res):
+    if not proc in res.activeQ:
+        if timer.eventsFired is not None:
+            proc.eventsFired = timer.eventsFired
+        proc.sim.reactivate(proc)
+
+def _renegeGet(timer, proc, res):
+    if proc in res.getQ:
+        if timer.eventsFired is not None:
+            proc.eventsFired = timer.eventsFired
+        proc.sim.reactivate(proc)
+
+def _renegePut(timer, proc, res):
+    if proc in res.putQ:
+        if timer.eventsFired is not None:
+            proc.eventsFired = timer.eventsFired
+        proc.sim.reactivate(proc)
+
+
+class Command(object):
+    """Reusable yield command. A PEM builds it once and yields it again and
+    again; calling it sets the parameters for the next yield and returns it:
+
+        h = Hold(self)
+        while True:
+            yield h(5)
+
+    The Simulation executes a yielded command with one direct call instead
+    of decoding a yield tuple. Subclasses: Hold, Passivate, Request, Release,
+    Get and Put.
+    """
+    __slots__ = ('proc', '_head', '_func', '_par', '_direct', '_target',
+                 '_method', '_table')
+    # yield code of the command
+    code = None
+
+    def _bind(self, proc, head, target, method):
+        """Binds the command to process proc. 'head' are the parameters
+        following proc which are fixed, 'method' is the name of the method of
+        'target' executing the command.
+        """
+        self.proc = proc
+        self._head = (self.code, proc) + head
+        self._target = target
+        self._method = method
+        self._rebind()
+
+    def _rebind(self):
+        """Chooses how to execute the command for the current dispatch table
+        of the Simulation.
+        """
+        self._table = table = self.proc.sim._dispatch
+        # Call the executing method directly unless the dispatch function is
+        # wrapped, e.g. for hooks.
+        self._direct = table[self.code] is Simulation._dispatch[self.code]
+        if self._direct:
+            self._func = getattr(self._target, self._method)
+        else:
+            self._func = table[self.code]
+
+    def __call__(self, *args):
+        self._par = (self._head + args, self.proc)
+        return self
+
+    def _execute(self):
+        if self.proc.sim._dispatch is not self._table:
+            self._rebind()
+        self._func(self._par)
+
+class Hold(Command):
+    """yield h(delay) == yield hold, proc, delay"""
+    __slots__ = ('delay',)
+    code = hold
+
+    def __init__(self, proc, delay = 0):
+        self._bind(proc, (), proc, '_hold')
+        self.delay = delay
+
+    def __call__(self, delay = 0):
+        self.delay = delay
+        return self
+
+    def _execute(self):
+        proc = self.proc
+        delay = self.delay
+        if proc.sim._dispatch is not self._table:
+            self._rebind()
+        if not self._direct:
+            self._func(((hold, proc, delay), proc))
+            return
+        # Same as Process._hold, without decoding a yield tuple
+        if delay < 0:
+            raise FatalSimerror('hold: delay time negative: %s, in %s' % (
+                                 delay, proc))
+        proc.interruptLeft = delay
+        proc._inInterrupt = False
+        proc.interruptCause = None
+        sim = proc.sim
+        sim._post(proc, sim._t + delay)
+
+class Passivate(Command):
+    """yield p() == yield passivate, proc"""
+    __slots__ = ()
+    code = passivate
+
+    def __init__(self, proc):
+        self._bind(proc, (), proc, '_passivate')
+        self()
+
+class Request(Command):
+    """yield r(priority) == yield request, proc, res, priority"""
+    __slots__ = ()
+    code = request
+
+    def __init__(self, proc, res, *args):
+        self._bind(proc, (res,), res, '_request')
+        self(*args)
+
+class Release(Command):
+    """yield r() == yield release, proc, res"""
+    __slots__ = ()
+    code = release
+
+    def __init__(self, proc, res):
+        self._bind(proc, (res,), res, '_release')
+        self()
+
+class Get(Command):
+    """yield g(what, priority) == yield get, proc, buffer, what, priority"""
+    __slots__ = ()
+    code = get
+
+    def __init__(self, proc, buffer, *args):
+        self._bind(proc, (buffer,), buffer, '_get')
+        self(*args)
+
+class Put(Command):
+    """yield p(what, priority) == yield put, proc, buffer, what, priority"""
+    __slots__ = ()
+    code = put
+
+    def __init__(self, proc, buffer, *args):
+        self._bind(proc, (buffer,), buffer, '_put')
+        self(*args)
+
 
 class Simulation(object):
     _dispatch = {
@@ -262,7 +441,22 @@ class Simulation(object):
             put: 'put'
     }
 
-    def __init__(self):
+    # The event list is rebuilt without its cancelled event notices as soon as
+    # more than compactRatio of its entries are cancelled. Event lists shorter
+    # than compactMinimum are never compacted. Set compactRatio to None to
+    # switch compaction off.
+    compactRatio = 0.5
+    compactMinimum = 64
+
+    def __init__(self, eventListType=HeapEventList):
+        """
+        eventListType={HeapEventList(default) | CalendarQueue}
+        """
+        self.eventListType = eventListType
+        # Profile collected while profiling is switched on
+        self.profile = None
+        # Registered hooks by kind (see addHook)
+        self._hooks = {}
         self.initialize()
 
     def initialize(self):
@@ -270,12 +464,17 @@ class Simulation(object):
         self.next_time = 0
 
         # Eventqueue stuff.
-        self._timestamps = []
+        self._timestamps = self.eventListType()
         self._sortpr = 0
 
         self._start = False
         self._stop = False
         self.condQ = []
+        # Processes waiting for a condition with declared dependencies, by id
+        # of the watched object, and ids of the objects changed during the
+        # current event.
+        self._watchers = {}
+        self._changed = []
         self.allMonitors = []
         self.allTallies = []
 
@@ -297,25 +496,50 @@ class Simulation(object):
             # before all other event notices at this time
             # heappush with highest priority value so far (negative of
             # monotonely decreasing number)
-            # store event notice in process instance
-            what._rec = [at, self._sortpr, what, False]
-            # make event list refer to it
-            heappush(self._timestamps, what._rec)
+            rec = (at, self._sortpr, what)
         else:
             # heappush with lowest priority
-            # store event notice in process instance
-            what._rec = [at,-self._sortpr, what, False]
-            # make event list refer to it
-            heappush(self._timestamps, what._rec)
+            rec = (at, -self._sortpr, what)
+        if what._rec is not None:
+            # the process has a live notice already, which this one replaces
+            self._timestamps.cancel(what._rec)
+        # store event notice in process instance; the notice is live as long
+        # as the process refers to it
+        what._rec = rec
+        # make event list refer to it
+        self._timestamps.push(rec)
 
     def _unpost(self, whom):
         """
         Mark event notice for whom as cancelled if whom is a suspended process
         """
         if whom._nextTime is not None:  # check if whom was actually active
-            whom._rec[3] = True ## Mark as cancelled
+            if whom._rec is not None:
+                evlist = self._timestamps
+                evlist.cancel(whom._rec) ## Mark as cancelled
+                if (self.compactRatio is not None and
+                        len(evlist) >= self.compactMinimum and
+                        evlist.nrCancelled > self.compactRatio * len(evlist)):
+                    evlist.compact()
             whom._nextTime = None
 
+    def _repost(self, what, at, prior = False):
+        """Cancels the event notice for what, if any, and posts a new one at
+        time 'at'."""
+        self._unpost(what)
+        self._post(what, at, prior)
+
+    def nrLiveNotices(self):
+        """Returns the number of uncancelled event notices in the event list.
+        """
+        return len(self._timestamps) - self._timestamps.nrCancelled
+
+    def nrCancelledNotices(self):
+        """Returns the number of cancelled event notices which are still held
+        in the event list.
+        """
+        return self._timestamps.nrCancelled
+
     def allEventNotices(self):
         """Returns string with eventlist as;
                 t1: processname, processname2
@@ -323,11 +547,8 @@ class Simulation(object):
                 . . .  .
         """
         ret = ''
-        tempList = []
-        tempList[:] = self._timestamps
-        tempList.sort()
-        # return only event notices which are not cancelled
-        tempList = [[x[0],x[2].name] for x in tempList if not x[3]]
+        # only event notices which are not cancelled
+        tempList = [[x[0],x[2].name] for x in self._timestamps.notices()]
         tprev = -1
         for t in tempList:
             # if new time, new line
@@ -346,11 +567,8 @@ class Simulation(object):
     def allEventTimes(self):
         """Returns list of all times for which events are scheduled.
         """
-        r = []
-        r[:] = self._timestamps
-        r.sort()
         # return only event times of not cancelled event notices
-        r1 = [x[0] for x in r if not x[3]]
+        r1 = [x[0] for x in self._timestamps.notices()]
         tprev = -1
         ret = []
         for t in r1:
@@ -381,6 +599,8 @@ class Simulation(object):
                 zeit = max(self._t, at)
             else:
                 zeit = max(self._t, self._t + delay)
+            if self._hooks:
+                self._notify('activate', obj, zeit, prior)
             self._post(obj, at = zeit, prior = prior)
 
     def reactivate(self, obj, at = 'undefined', delay = 'undefined',
@@ -389,16 +609,91 @@ class Simulation(object):
         suspended or passive."""
         # Object may be active, suspended or passive
         if not obj._terminated:
-            a = Process('SimPysystem',sim=self)
-            a.cancel(obj)
-            # object now passive
             if at == 'undefined':
                 at = self._t
             if delay == 'undefined':
                 zeit = max(self._t, at)
             else:
                 zeit = max(self._t, self._t + delay)
-            self._post(obj, at = zeit, prior = prior)
+            if self._hooks:
+                self._notify('reactivate', obj, zeit, prior)
+            self._repost(obj, at = zeit, prior = prior)
+
+    def schedule(self, callback, at = 'undefined', delay = 'undefined',
+                 prior = False, args = (), name = None):
+        """
+        Schedules the call callback(*args) at time 'at' or after 'delay',
+        without a process. The call is ordered among the event notices like
+        the activation of a process at that time. Returns the Timer holding
+        its event notice; its cancel() method cancels the call.
+        """
+        if at == 'undefined':
+            at = self._t
+        if delay == 'undefined':
+            zeit = max(self._t, at)
+        else:
+            zeit = max(self._t, self._t + delay)
+        timer = Timer(self, callback, *args)
+        timer._name = name or callback
+        if self._hooks:
+            self._notify('schedule', timer, zeit, prior)
+        self._post(timer, zeit, prior)
+        return timer
+
+    def scheduleArrivals(self, factory, times = None, interarrival = None,
+                         count = None, at = 'undefined', name = 'arrivals'):
+        """
+        Activates arriving entities without a source process. factory(i)
+        returns the i-th entity (from 0) and its process execution method,
+        which is activated when it arrives. The arrivals are at the times in
+        the ascending iterable or NumPy array 'times' (at most 'count' of
+        them), or, for the callable 'interarrival', from time 'at' on with
+        interarrival() between consecutive ones ('count' arrivals, default:
+        unlimited).
+
+        The events, and the calls of factory and interarrival, are ordered
+        as for a source process which creates and activates each entity and
+        then holds until the next arrival. Returns the Arrivals; its cancel()
+        method stops them.
+
+        Raises FatalSimerror if 'times' is not ascending or starts before
+        now(); for an iterator without len(), each time is checked when it
+        is taken from it.
+        """
+        if (times is None) == (interarrival is None):
+            raise FatalSimerror(
+                    'scheduleArrivals: give either times or interarrival')
+        if hasattr(times, 'dtype'):  # NumPy array
+            if len(times):
+                if times[0] < self._t:
+                    _pastArrival(times[0], self._t)
+                later = times[1:] < times[:-1]
+                if later.any():
+                    z = later.argmax()
+                    _unorderedArrival(times[z + 1], times[z])
+        elif hasattr(times, '__len__'):
+            last = None
+            for t in times:
+                if last is None:
+                    if t < self._t:
+                        _pastArrival(t, self._t)
+                elif t < last:
+                    _unorderedArrival(t, last)
+                last = t
+        arrivals = Arrivals(self, factory, times = times,
+                            interarrival = interarrival, count = count,
+                            name = name)
+        if times is not None:
+            first = next(arrivals.times, None)
+            if first is not None:
+                if first < self._t:
+                    _pastArrival(first, self._t)
+                self._post(arrivals.timer, first)
+        elif count is None or count > 0:
+            if at == 'undefined':
+                at = self._t
+            self._post(arrivals.timer, max(self._t, at))
+        return arrivals
 
     def startCollection(self, when = 0.0, monitors = None, tallies = None):
         """Starts data collection of all designated Monitor and Tally objects
@@ -433,21 +728,170 @@ class Simulation(object):
                       at = when, prior = True)
 
 
-    def _waitUntilFunc(self, proc, cond):
+    def _waitUntilFunc(self, proc, cond, watched = None):
         """
         Puts a process 'proc' waiting for a condition into a waiting queue.
         'cond' is a predicate function which returns True if the condition is
         satisfied.
+        'watched' is an object or a list of objects the condition depends on.
+        If given, 'cond' is only tested again after one of them has changed
+        (see changed), otherwise it is tested after every event.
         """
         if not cond():
-            self.condQ.append(proc)
             proc.cond = cond
+            if watched is None:
+                self.condQ.append(proc)
+            else:
+                if not isinstance(watched, (list, tuple)):
+                    watched = (watched,)
+                proc._watched = watched
+                for obj in watched:
+                    self._watchers.setdefault(id(obj), []).append(proc)
             # passivate calling process
             proc._nextTime = None
         else:
             #schedule continuation of calling process
             self._post(proc, at = self._t, prior = 1)
 
+    def changed(self, obj):
+        """
+        Signals that the state of 'obj' has changed. Processes waiting with
+        'yield waituntil, self, cond, obj' test their conditions again at the
+        end of the current event. Level, Store and Resource instances and
+        Watched attributes call this themselves.
+        """
+        key = id(obj)
+        if key in self._watchers and not key in self._changed:
+            self._changed.append(key)
+
+    def _testWatchers(self):
+        """
+        Tests the conditions of the processes watching the objects changed
+        during the current event and reactivates those which are satisfied.
+        """
+        changed = self._changed
+        self._changed = []
+        for key in changed:
+            for proc in self._watchers.get(key, [])[:]:
+                if proc._watched is not None and proc.cond():
+                    for obj in proc._watched:
+                        waiters = self._watchers[id(obj)]
+                        waiters.remove(proc)
+                        if not waiters:
+                            del self._watchers[id(obj)]
+                    proc._watched = None
+                    self.reactivate(proc)
+
+    # Kinds of hooks and the arguments they are called with:
+    # 'post' (what, at, prior): an event notice is posted
+    # 'activate' (obj, at, prior): a process is activated
+    # 'reactivate' (obj, at, prior): a process is reactivated
+    # 'dispatch' (command, par): a yield command has been executed; par is
+    #     (yield tuple, process)
+    # 'terminate' (proc): a process execution method has ended
+    # 'signal' (evt): a SimEvent is signalled
+    # 'interrupt' (who, victim): who interrupts victim (called before the
+    #     victim is reactivated)
+    # 'enter' (queue, obj), 'leave' (queue, obj): obj enters or leaves a
+    #     queue of a resource or buffer (waitQ, activeQ, getQ or putQ)
+    # 'schedule' (timer, at, prior): a call is scheduled (see schedule)
+    # 'call' (timer): a scheduled call is made (called before the callback)
+    hookKinds = ('post', 'activate', 'reactivate', 'dispatch', 'terminate',
+                 'signal', 'interrupt', 'enter', 'leave', 'schedule', 'call')
+
+    def addHook(self, kind, func):
+        """
+        Registers func to be called on every event of the given kind (see
+        hookKinds). Hooks of the same kind are called in the order of
+        registration.
+        """
+        if not kind in self.hookKinds:
+            raise ValueError('unknown kind of hook: %s' % kind)
+        # The lists of hooks are replaced, not changed, so that a hook may
+        # add or remove hooks while hooks of its kind are being called.
+        self._hooks[kind] = self._hooks.get(kind, []) + [func]
+        self._installHooks()
+
+    def removeHook(self, kind, func):
+        """Unregisters func as hook of the given kind."""
+        hooks = list(self._hooks[kind])
+        hooks.remove(func)
+        if hooks:
+            self._hooks[kind] = hooks
+        else:
+            del self._hooks[kind]
+        self._installHooks()
+
+    def _installHooks(self):
+        """
+        Replaces _post, _terminate and the dispatch table of this instance by
+        versions calling the hooks while there are any, so that a Simulation
+        without hooks runs the plain ones.
+        """
+        hooked = self.__dict__
+        if 'post' in self._hooks:
+            hooked['_post'] = self._hookedPost(self._hooks['post'])
+        else:
+            hooked.pop('_post', None)
+        if 'terminate' in self._hooks:
+            hooked['_terminate'] = self._hookedTerminate(
+                    self._hooks['terminate'])
+        else:
+            hooked.pop('_terminate', None)
+        if 'dispatch' in self._hooks:
+            hooks = self._hooks['dispatch']
+            self._dispatch = dict(
+                    [(command, self._hookedDispatch(command, func, hooks))
+                     for command, func in self.__class__._dispatch.items()])
+        else:
+            hooked.pop('_dispatch', None)
+
+    def _notify(self, kind, *args):
+        """Calls the hooks of the given kind."""
+        for hook in self._hooks.get(kind, ()):
+            hook(*args)
+
+    # The hooked functions are built for the current list of hooks (which is
+    # replaced, not changed, by addHook and removeHook); a single hook is
+    # called directly.
+
+    def _hookedPost(self, hooks):
+        post = self.__class__._post.__get__(self, self.__class__)
+        if len(hooks) == 1:
+            hook = hooks[0]
+            def hookedPost(what, at, prior = False):
+                hook(what, at, prior)
+                post(what, at, prior)
+        else:
+            def hookedPost(what, at, prior = False):
+                for hook in hooks:
+                    hook(what, at, prior)
+                post(what, at, prior)
+        return hookedPost
+
+    def _hookedTerminate(self, hooks):
+        terminate = self.__class__._terminate.__get__(self, self.__class__)
+        def hookedTerminate(process):
+            for hook in hooks:
+                hook(process)
+            terminate(process)
+        return hookedTerminate
+
+    def _hookedDispatch(self, command, func, hooks):
+        """Returns a wrapper for dispatch function func which calls the
+        'dispatch' hooks after it."""
+        if len(hooks) == 1:
+            hook = hooks[0]
+            def dispatch(par):
+                func(par)
+                hook(command, par)
+        else:
+            def dispatch(par):
+                func(par)
+                for hook in hooks:
+                    hook(command, par)
+        return dispatch
+
     def _terminate(self, process):
         """Marks a process as terminated."""
         process._nextpoint = None
@@ -459,17 +903,18 @@ class Simulation(object):
         Checks if there are events which can be processed. Returns ``True`` if
         there are events and the simulation has not been stopped.
         """
-        return not self._stop and self._timestamps
+        return not self._stop and self._timestamps.first() is not None
 
     def peek(self):
         """
         Returns the time of the next event or infinity, if no
         more events are scheduled.
         """
-        if not self._timestamps:
+        rec = self._timestamps.first()
+        if rec is None:
             return infinity
         else:
-            return self._timestamps[0][0]
+            return rec[0]
 
     def step(self):
         """
@@ -477,38 +922,66 @@ class Simulation(object):
         """
 
         # Fetch next process and advance its process execution method.
-        noActiveNotice = True
         # Get an uncancelled event
-        while noActiveNotice:
-            if self._timestamps:
-                _tnotice, p, proc, cancelled = heappop(self._timestamps)
-                noActiveNotice = cancelled
-            else:
-                return None
+        rec = self._timestamps.popNext()
+        if rec is None:
+            return None
+        proc = rec[2]
 
         # Advance simulation time.
         proc._rec = None
-        self._t = _tnotice
+        self._t = rec[0]
 
-        # Execute the event. This will advance the process execution method.
-        try:
-            resultTuple = next(proc._nextpoint)
-
-            # Process the command function which has been yielded by the
-            # process.
-            if type(resultTuple[0]) == tuple:
-                # allowing for reneges, e.g.:
-                # >>> yield (request, self, res),(waituntil, self, cond)
-                command = resultTuple[0][0]
-            else:
-                command = resultTuple[0]
-            if __debug__:
-                if not command in self._commandcodes:
-                    raise FatalSimerror('Illegal command: yield %s'%command)
-            self._dispatch[command]((resultTuple, proc))
-        except StopIteration:
-            # Process execution method has terminated.
-            self._terminate(proc)
+        if proc.__class__ is Timer:
+            # A renege timer or scheduled call fires; there is no process to
+            # advance.
+            proc._fire()
+        else:
+            # Execute the event. This will advance the process execution
+            # method.
+            try:
+                self._execute(next(proc._nextpoint), proc)
+            except StopIteration:
+                # Process execution method has terminated.
+                self._terminate(proc)
+
+        if self._changed or self.condQ:
+            self._testConditions()
+
+        # Return time of the next scheduled event.
+        rec = self._timestamps.first()
+        if rec is None:
+            return None
+        else:
+            return rec[0]
+
+    def _execute(self, resultTuple, proc):
+        """Executes the command resultTuple yielded by proc and returns its
+        code."""
+        if (type(resultTuple) is not tuple and
+                isinstance(resultTuple, Command)):
+            # A reusable command object executes itself.
+            resultTuple._execute()
+            return resultTuple.code
+        # Process the command function which has been yielded by the process.
+        if type(resultTuple[0]) == tuple:
+            # allowing for reneges, e.g.:
+            # >>> yield (request, self, res),(waituntil, self, cond)
+            command = resultTuple[0][0]
+        else:
+            command = resultTuple[0]
+        if __debug__:
+            if not command in self._commandcodes:
+                raise FatalSimerror('Illegal command: yield %s'%command)
+        self._dispatch[command]((resultTuple, proc))
+        return command
+
+    def _testConditions(self):
+        """Reactivates the waiting processes whose conditions hold after an
+        event."""
+        # Test the conditions which depend on objects changed by this event.
+        if self._changed:
+            self._testWatchers()
 
         # Test the conditions for all waiting processes if there are any at
         # all. Where condition are satisfied, reactivate that process
@@ -526,12 +999,81 @@ class Simulation(object):
                 else:
                     i += 1
 
-        # Return time of the next scheduled event.
-        #return self._timestamps[0][0] if self._timestamps else None
-        if self._timestamps:
-            return self._timestamps[0][0]
+    def startProfiling(self):
+        """
+        Switches profiling on and returns the Profile collecting the
+        statistics. Profiling replaces step by _profiledStep for this
+        instance only, so step itself does not pay for it. Takes effect at
+        the next call of simulate.
+        """
+        self.profile = Profile(self)
+        self.step = self._profiledStep
+        return self.profile
+
+    def stopProfiling(self):
+        """Switches profiling off and returns the Profile."""
+        self.__dict__.pop('step', None)
+        return self.profile
+
+    def _profiledStep(self):
+        """
+        Executes the next uncancelled event like step and records the time
+        spent in the process execution method and in the command in
+        self.profile.
+        """
+        start = clock()
+        profile = self.profile
+        rec = self._timestamps.popNext()
+        if rec is None:
+            return None
+        proc = rec[2]
+        proc._rec = None
+        self._t = rec[0]
+
+        if proc.__class__ is Timer:
+            key = (Timer, None)
+            t = clock()
+            proc._fire()
+            pemTime = clock() - t
         else:
+            key = (proc.__class__, proc._nextpoint.gi_code)
+            try:
+                t = clock()
+                try:
+                    resultTuple = next(proc._nextpoint)
+                finally:
+                    pemTime = clock() - t
+                t = clock()
+                command = self._execute(resultTuple, proc)
+                t = clock() - t
+                stats = profile.commands.setdefault(
+                        self._commandwords[command], [0, 0.0])
+                stats[0] += 1
+                stats[1] += t
+            except StopIteration:
+                self._terminate(proc)
+        stats = profile.pems.setdefault(key, [0, 0.0])
+        stats[0] += 1
+        stats[1] += pemTime
+
+        if self._changed or self.condQ:
+            self._testConditions()
+
+        evlist = self._timestamps
+        nrNotices = len(evlist)
+        if nrNotices > profile.maxNotices:
+            profile.maxNotices = nrNotices
+        if nrNotices:
+            ratio = float(evlist.nrCancelled) / nrNotices
+            if ratio > profile.maxCancelledRatio:
+                profile.maxCancelledRatio = ratio
+        rec = evlist.first()
+        profile.events += 1
+        profile.wallTime += clock() - start
+        if rec is None:
             return None
+        else:
+            return rec[0]
 
     def simulate(self, until=0):
         """
@@ -546,15 +1088,17 @@ class Simulation(object):
             # the self-lookup. Note that this can't be done for _stop because
             # this variable will get overwritten, bools are immutable.
             step = self.step
-            timestamps = self._timestamps
-            while not self._stop and timestamps and timestamps[0][0] <= until:
+            first = self._timestamps.first
+            rec = first()
+            while not self._stop and rec is not None and rec[0] <= until:
                 step()
+                rec = first()
 
-            if not self._stop and timestamps:
+            if not self._stop and rec is not None:
                 # Timestamps left, simulation not stopped
                 self._t = until
                 return 'SimPy: Normal exit at time %s' % self._t
-            elif not timestamps:
+            elif rec is None:
                 # No more timestamps
                 return 'SimPy: No more events at time %s' % self._t
             else:
@@ -13,12 +13,12 @@ import SimPy
 
 
 class SimulationRT(Simulation):
-    def __init__(self):
+    def __init__(self, eventListType=HeapEventList):
         if sys.platform == 'win32':  #take care of differences in clock accuracy
             self.wallclock = time.clock
         else:
             self.wallclock = time.time
-        Simulation.__init__(self)
+        Simulation.__init__(self, eventListType)
 
     def rtnow(self):
         return self.wallclock() - self.rtstart
@@ -40,7 +40,7 @@ class SimulationRT(Simulation):
             self.rtstart = self.wallclock()
             self.rtset(rel_speed)
 
-            while self._timestamps and not self._stop:
+            while self.has_events():
                 next_event_time = self.peek()
                 if next_event_time > until: break
 
@@ -56,7 +56,7 @@ class SimulationRT(Simulation):
             # There are still events in the timestamps list and the simulation
             # has not been manually stopped. This means we have reached the stop
             # time.
-            if not self._stop and self._timestamps:
+            if self.has_events():
                 self._t = until
                 return 'SimPy: Normal exit'
             else:
@@ -10,8 +10,8 @@ from SimPy.Simulation import *
 _step = False
 
 class SimulationStep(Simulation):
-    def __init__(self):
-        Simulation.__init__(self)
+    def __init__(self, eventListType=HeapEventList):
+        Simulation.__init__(self, eventListType)
         self._step = False
 
     def initialize(self):
@@ -30,6 +30,10 @@ class SimulationStep(Simulation):
         Simulation.step(self)
         if self._step: self.callback()
 
+    def _profiledStep(self):
+        Simulation._profiledStep(self)
+        if self._step: self.callback()
+
     def simulate(self, callback=lambda: None, until=0):
         """
         Simulates until simulation time reaches ``until``. After processing each
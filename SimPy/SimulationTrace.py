@@ -13,57 +13,16 @@ from SimPy.Lister import *
 from SimPy.Simulation import *
 
 
-def trace_dispatch(trace, command, func):
-    """
-    Returns a wrapper for ``func`` which will record the dispatch in the trace
-    log.
-    """
-    def dispatch(event):
-        func(event)
-        trace.recordEvent(command, event)
-
-    return dispatch
-
 class SimulationTrace(Simulation):
-    def __init__(self):
-        Simulation.__init__(self)
+    def __init__(self, eventListType=HeapEventList):
+        Simulation.__init__(self, eventListType)
         self.trace = Trace(sim=self)
-        # Trace method to be called on _post calls.
-        self._post_tracing = None
-
-        # We use our own instance of the command dictionary.
-        self._dispatch = dict(Simulation._dispatch)
-
-        # Now wrap all commands in a tracing call.
-        for command, func in self._dispatch.items():
-            self._dispatch[command] = trace_dispatch(self.trace, command, func)
+        # The trace is fed by hooks of this Simulation.
+        self.trace._attach()
 
     def initialize(self):
         Simulation.initialize(self)
 
-
-    def _post(self, what, at, prior=False):
-        if self._post_tracing is not None: self._post_tracing(what, at, prior)
-        Simulation._post(self, what, at, prior)
-
-    def activate(
-            self, obj, process, at='undefined', delay='undefined', prior=False):
-        # Activate _post tracing.
-        self._post_tracing = self.trace.recordActivate
-        Simulation.activate(self, obj, process, at, delay, prior)
-        self._post_tracing = None
-
-    def reactivate(
-            self, obj, at='undefined', delay='undefined', prior=False):
-        # Activate _post tracing.
-        self._post_tracing = self.trace.recordReactivate
-        Simulation.reactivate(self, obj, at, delay, prior)
-        self._post_tracing = None
-
-    def _terminate(self, process):
-        self.trace.tterminated(process)
-        Simulation._terminate(self, process)
-
     def simulate(self, until=0):
         try:
             return Simulation.simulate(self, until)
@@ -71,16 +30,45 @@ class SimulationTrace(Simulation):
             if not(self.trace.outfile is sys.stdout):
                 self.trace.outfile.close()
 
+def _never(kind, who, target):
+    return False
+
+def _named(obj, names):
+    """Tells whether obj, or one of the objects in list obj, has one of the
+    given names."""
+    if type(obj) in (list, tuple):
+        for x in obj:
+            if getattr(x, 'name', None) in names:
+                return True
+        return False
+    return getattr(obj, 'name', None) in names
+
+def _target(whole):
+    """Returns the resource, buffer or event(s) of yield tuple whole."""
+    if type(whole[0]) == tuple:
+        # compound yield
+        whole = whole[0]
+    if len(whole) > 2 and whole[0] != hold:
+        return whole[2]
+    return None
+
 class Trace(Lister):
     commands={hold:'hold', passivate:'passivate', request:'request', release:'release',
               waitevent:'waitevent', queueevent:'queueevent', waituntil:'waituntil',
             get:'get', put:'put'}
+    # Hooks needed to trace the entries of toTrace other than the commands
+    hookKinds = {'activate': ('activate',), 'reactivate': ('reactivate',),
+                 'interrupt': ('interrupt', 'reactivate'),
+                 'terminated': ('terminate',), 'signal': ('signal',),
+                 'schedule': ('schedule',), 'call': ('call',)}
+    allHooks = ('activate', 'reactivate', 'dispatch', 'terminate', 'signal',
+                'interrupt', 'schedule', 'call')
 
     def __init__(self, start = 0, end = 10000000000, toTrace=\
                  ['hold', 'activate', 'cancel', 'reactivate', 'passivate', 'request',
                   'release', 'interrupt', 'terminated', 'waitevent', 'queueevent',
-                  'signal', 'waituntil', 'put', 'get'
-                 ],outfile = sys.stdout,sim=None):
+                  'signal', 'waituntil', 'put', 'get', 'schedule', 'call'
+                 ],outfile = sys.stdout,sim=None,processes=None,resources=None):
 
         Trace.commandsproc={hold:Trace.thold, passivate:Trace.tpassivate,
                             request:Trace.trequest, release:Trace.trelease,
@@ -93,9 +81,17 @@ class Trace(Lister):
         self.start = start
         self.end = end
         self.toTrace = toTrace
+        self.processes = processes
+        self.resources = resources
         self.tracego = True
         self.outfile = outfile
         self._comment = None
+        # Interrupt to be recorded after the reactivation of its victim
+        self._interrupt = None
+        # Hooks of the Simulation registered by this trace, by kind
+        self._hooks = {}
+        self._attached = False
+        self._compile()
 
     def treset(self):
         Trace.commandsproc={hold:Trace.thold, passivate:Trace.tpassivate,
@@ -108,10 +104,14 @@ class Trace(Lister):
         self.end = 10000000000
         self.toTrace = ['hold', 'activate', 'cancel', 'reactivate', 'passivate', 'request',
                         'release', 'interrupt', 'terminated', 'waitevent', 'queueevent',
-                        'signal', 'waituntil', 'put', 'get']
+                        'signal', 'waituntil', 'put', 'get', 'schedule',
+                        'call']
+        self.processes = None
+        self.resources = None
         self.tracego = True
         self.outfile = sys.stdout
         self._comment = None
+        self._compile()
 
     def tchange(self,**kmvar):
         for v in kmvar:
@@ -123,18 +123,112 @@ class Trace(Lister):
                 self.toTrace = kmvar[v]
             elif v == 'outfile':
                 self.outfile = kmvar[v]
+            elif v == 'processes':
+                self.processes = kmvar[v]
+            elif v == 'resources':
+                self.resources = kmvar[v]
+        self._compile()
 
     def tstart(self):
         self.tracego = True
+        self._compile()
 
     def tstop(self):
         self.tracego = False
+        self._compile()
 
     def ifTrace(self, cond):
-        if self.tracego and (self.start <= self.sim.now() <= self.end)\
+        if self.tracego and (self.start <= self.sim._t <= self.end)\
            and cond:
             return True
 
+    def _attach(self):
+        """Makes the Simulation feed this trace through its hooks."""
+        self._attached = True
+        self._compile()
+
+    def _setHooks(self, kinds):
+        """Registers the hooks of the given kinds with the Simulation and
+        removes the others."""
+        hooks = {'activate': self.recordActivate,
+                 'reactivate': self.recordReactivate,
+                 'dispatch': self.recordEvent,
+                 'terminate': self.tterminated,
+                 'signal': self.recordSignal,
+                 'interrupt': self.recordInterrupt,
+                 'schedule': self.recordSchedule,
+                 'call': self.recordCall}
+        for kind in list(self._hooks):
+            if not kind in kinds:
+                self.sim.removeHook(kind, self._hooks.pop(kind))
+        for kind in kinds:
+            if not kind in self._hooks:
+                self._hooks[kind] = hooks[kind]
+                self.sim.addHook(kind, hooks[kind])
+
+    def _recorded(self):
+        """Ends the recording of an event: drops the comment and, if the
+        trace was widened for the comment, narrows it again."""
+        self._comment = None
+        if self._attached and len(self._hooks) > len(self._needed):
+            self._setHooks(self._needed)
+
+    def _compile(self):
+        """
+        Compiles the trace parameters into the predicate _traced(kind, who,
+        target), which tells whether an event is traced. kind is an entry of
+        toTrace or a yield command code, who the process concerned and target
+        the resource, buffer, event or, for an interrupt, process concerned.
+        """
+        # Only the hooks which can lead to a trace line are registered, so
+        # that the events which are not traced cost nothing.
+        needed = set()
+        if self.tracego:
+            for name in self.toTrace:
+                if name in Trace.hookKinds:
+                    needed.update(Trace.hookKinds[name])
+                elif name in Trace.commands.values():
+                    needed.add('dispatch')
+        self._needed = needed
+        if self._attached:
+            self._setHooks(needed)
+        if not self.tracego or not self.toTrace:
+            self._traced = _never
+            return
+        kinds = set(self.toTrace)
+        for command, name in Trace.commands.items():
+            if name in kinds:
+                kinds.add(command)
+        kinds = frozenset(kinds)
+        sim = self.sim
+        start = self.start
+        end = self.end
+
+        def traced(kind, who, target):
+            return kind in kinds and start <= sim._t <= end
+
+        if self.processes is None and self.resources is None:
+            self._traced = traced
+            return
+        inWindow = traced
+        processes = self.processes
+        if processes is not None:
+            processes = frozenset(processes)
+        resources = self.resources
+        if resources is not None:
+            resources = frozenset(resources)
+
+        def traced(kind, who, target):
+            if not inWindow(kind, who, target):
+                return False
+            if processes is not None and not (
+                    _named(who, processes) or _named(target, processes)):
+                return False
+            if resources is not None and not _named(target, resources):
+                return False
+            return True
+        self._traced = traced
+
     def thold(self, par):
         try:
             return 'delay: %s' % par[0][2]
@@ -245,7 +339,7 @@ class Trace(Lister):
     tput = classmethod(tput)
 
     def recordEvent(self, command, whole):
-        if self.ifTrace(Trace.commands[command] in self.toTrace):
+        if self._traced(command, whole[1], _target(whole[0])):
             if not type(whole[0][0]) == tuple:
                 print(whole[0][1].sim.now(),\
                     Trace.commands[command],\
@@ -266,58 +360,88 @@ class Trace(Lister):
                 if self._comment:
                     print('----', self._comment, file=self.outfile)
 
-        self._comment = None
+        self._recorded()
 
     def recordInterrupt(self, who, victim):
-        if self.ifTrace('interrupt' in self.toTrace):
+        # Called before the victim is reactivated. The interrupt is recorded
+        # after the reactivation, and gets the comment.
+        if 'interrupt' in self._needed:
+            self._interrupt = (who, victim, self._comment)
+        self._recorded()
+
+    def _recordInterrupt(self, who, victim):
+        if self._traced('interrupt', who, victim):
             print('%s interrupt by: <%s> of: <%s>'\
                                    %(who.sim.now(),who.name, victim.name), file=self.outfile)
             if self._comment:
                 print('----', self._comment, file=self.outfile)
-        self._comment = None
+        self._recorded()
 
     def recordCancel(self, who, victim):
-        if self.ifTrace('cancel' in self.toTrace):
+        if self._traced('cancel', who, victim):
             print('%s cancel by: <%s> of: <%s> '\
             %(who.sim.now(),who.name, victim.name), file=self.outfile)
             if self._comment:
                 print('----', self._comment, file=self.outfile)
-        self._comment = None
+        self._recorded()
 
     def recordActivate(self, who, when, prior):
-        if self.ifTrace('activate' in self.toTrace):
+        if self._traced('activate', who, None):
             print('%s activate <%s> at time: %s prior: %s'\
                      %(who.sim.now(),who.name,when, prior), file=self.outfile)
             if self._comment:
                 print('----', self._comment, file=self.outfile)
-        self._comment = None
+        self._recorded()
 
     def recordReactivate(self, who, when, prior):
-        if self.ifTrace('reactivate' in self.toTrace):
+        if self._traced('reactivate', who, None):
             print('%s reactivate <%s> time: %s prior: %s'\
                      %(who.sim.now(),who.name,when, prior), file=self.outfile)
             if self._comment:
                 print('----', self._comment, file=self.outfile)
-        self._comment = None
+        self._recorded()
+        if self._interrupt is not None and self._interrupt[1] is who:
+            interrupter, victim, self._comment = self._interrupt
+            self._interrupt = None
+            self._recordInterrupt(interrupter, victim)
+
+    def recordSchedule(self, timer, when, prior):
+        if self._traced('schedule', timer, None):
+            print('%s schedule <%s> at time: %s prior: %s'\
+                     %(self.sim.now(),timer.name,when, prior), file=self.outfile)
+            if self._comment:
+                print('----', self._comment, file=self.outfile)
+        self._recorded()
+
+    def recordCall(self, timer):
+        if self._traced('call', timer, None):
+            print('%s call <%s>'%(self.sim.now(),timer.name), file=self.outfile)
+            if self._comment:
+                print('----', self._comment, file=self.outfile)
+        self._recorded()
 
     def recordSignal(self, evt):
-        if self.ifTrace('signal' in self.toTrace):
+        if self._traced('signal', None, evt):
             print('%s event <%s> is signalled' \
                                    %(evt.sim.now(),evt.name), file=self.outfile)
             if self._comment:
                 print('----', self._comment, file=self.outfile)
-        self._comment = None
+        self._recorded()
 
     def tterminated(self, who):
-        if self.ifTrace('terminated' in self.toTrace):
+        if self._traced('terminated', who, None):
             print('%s <%s> terminated'\
                      %(who.sim.now(),who.name), file=self.outfile)
             if self._comment:
                 print('----', self._comment, file=self.outfile)
-        self._comment = None
+        self._recorded()
 
     def ttext(self, par):
         self._comment = par
+        # The comment belongs to the next scheduling statement, whether it is
+        # traced or not.
+        if self._attached:
+            self._setHooks(Trace.allHooks)
 
 # For backward compatibility
 Globals.sim = SimulationTrace()
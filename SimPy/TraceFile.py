@@ -0,0 +1,358 @@
+# coding=utf-8
+"""
+This file contains TraceWriter, which writes a compact binary trace of a
+Simulation, and TraceReader, which reads it back.
+
+A trace file consists of a header, fixed-size event records and, at its end,
+the table of the names of the processes, resources and events referenced by
+the records. Each record holds the simulation time, the kind of the event
+(the yield command code, or one of the codes below for other events), the id
+of the process or scheduled call, the id of the resource, buffer or event and
+one numeric argument (delay, priority, amount, activation time or number of
+events).
+
+Run as a script to print or convert a trace file:
+
+    python -m SimPy.TraceFile trace.bin [--start T] [--end T]
+        [--kinds hold,request] [--names NAME,...] [--csv]
+
+"""
+from __future__ import print_function
+
+import struct
+import sys
+import weakref
+from functools import partial
+
+from SimPy.Simulation import hold, passivate, request, release, waitevent, \
+        queueevent, waituntil, get, put
+
+# Codes of the events which are not yield commands
+activate = 10
+reactivate = 11
+terminated = 12
+signal = 13
+interrupt = 14
+schedule = 15
+call = 16
+
+kinds = {hold: 'hold', passivate: 'passivate', request: 'request',
+         release: 'release', waitevent: 'waitevent',
+         queueevent: 'queueevent', waituntil: 'waituntil', get: 'get',
+         put: 'put', activate: 'activate', reactivate: 'reactivate',
+         terminated: 'terminated', signal: 'signal', interrupt: 'interrupt',
+         schedule: 'schedule', call: 'call'}
+
+MAGIC = b'SIMPYTR1'
+# time, kind, process id, resource id, argument
+RECORD = struct.Struct('<dBIId')
+# name table: number of names; per name: id, length of name in bytes
+COUNT = struct.Struct('<I')
+NAME = struct.Struct('<IH')
+# offset of the name table, followed by MAGIC
+TRAILER = struct.Struct('<Q')
+
+
+class TraceWriter(object):
+    """
+    Writes a binary trace of Simulation sim to outfile (a file name or a file
+    object open for binary writing). The records are buffered and written in
+    blocks of bufferSize bytes; close() writes the name table and stops the
+    trace. Objects get their ids in the order in which they first show up in
+    the trace; id 0 means 'none'. The writer does not keep traced objects
+    alive: a process gives up its id when it terminates, other objects when
+    they are garbage collected. A name is taken when its object terminates, is
+    collected or when the trace is closed (first seen, for collected
+    objects).
+    """
+    def __init__(self, sim, outfile, bufferSize = 1 << 16):
+        self.sim = sim
+        if hasattr(outfile, 'write'):
+            self.outfile = outfile
+            self._ownFile = False
+        else:
+            self.outfile = open(outfile, 'wb')
+            self._ownFile = True
+        self.bufferSize = bufferSize
+        self.nrRecords = 0
+        self._buffer = []
+        self._buffered = 0
+        self._pack = RECORD.pack
+        # id(object) -> (id in the trace, weak reference to the object, or
+        # the object itself if it cannot be referenced weakly)
+        self._ids = {}
+        self._names = []
+        self.outfile.write(MAGIC)
+        self._offset = len(MAGIC)
+        self._hooks = [('activate', self._recordActivate),
+                       ('reactivate', self._recordReactivate),
+                       ('dispatch', self._recordDispatch),
+                       ('terminate', self._recordTerminate),
+                       ('signal', self._recordSignal),
+                       ('interrupt', self._recordInterrupt),
+                       ('schedule', self._recordSchedule),
+                       ('call', self._recordCall)]
+        for kind, hook in self._hooks:
+            sim.addHook(kind, hook)
+
+    def _id(self, obj):
+        key = id(obj)
+        try:
+            return self._ids[key][0]
+        except KeyError:
+            pass
+        self._names.append(_name(obj))
+        n = len(self._names)
+        try:
+            ref = weakref.ref(obj, partial(self._collected, key))
+        except TypeError:
+            # e.g. a LightProcess; dropped when it terminates
+            ref = obj
+        self._ids[key] = (n, ref)
+        return n
+
+    def _collected(self, key, ref):
+        entry = self._ids.get(key)
+        if entry is not None and entry[1] is ref:
+            del self._ids[key]
+
+    def _release(self, obj):
+        """Gives up the id of obj, taking its current name."""
+        entry = self._ids.pop(id(obj), None)
+        if entry is not None:
+            self._names[entry[0] - 1] = _name(obj)
+
+    def _write(self, kind, proc, target, arg):
+        if proc is not None:
+            proc = self._id(proc)
+        else:
+            proc = 0
+        if target is not None:
+            target = self._id(target)
+        else:
+            target = 0
+        self._buffer.append(self._pack(self.sim._t, kind, proc, target, arg))
+        self._buffered += RECORD.size
+        if self._buffered >= self.bufferSize:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered records to the trace file."""
+        data = b''.join(self._buffer)
+        self.outfile.write(data)
+        self._offset += len(data)
+        self.nrRecords += len(self._buffer)
+        self._buffer = []
+        self._buffered = 0
+
+    def close(self):
+        """Stops the trace, writes the name table and closes the trace file
+        if it was opened by the TraceWriter."""
+        for kind, hook in self._hooks:
+            self.sim.removeHook(kind, hook)
+        self._hooks = []
+        self.flush()
+        for n, ref in list(self._ids.values()):
+            if isinstance(ref, weakref.ref):
+                ref = ref()
+            if ref is not None:
+                self._names[n - 1] = _name(ref)
+        self._ids = {}
+        table = [COUNT.pack(len(self._names))]
+        for n, name in enumerate(self._names):
+            name = name.encode('utf-8')[:0xffff]
+            table.append(NAME.pack(n + 1, len(name)))
+            table.append(name)
+        table.append(TRAILER.pack(self._offset))
+        table.append(MAGIC)
+        self.outfile.write(b''.join(table))
+        if self._ownFile:
+            self.outfile.close()
+        else:
+            self.outfile.flush()
+
+    def _recordActivate(self, proc, at, prior):
+        self._write(activate, proc, None, at)
+
+    def _recordReactivate(self, proc, at, prior):
+        self._write(reactivate, proc, None, at)
+
+    def _recordTerminate(self, proc):
+        self._write(terminated, proc, None, 0)
+        self._release(proc)
+
+    def _recordSignal(self, evt):
+        self._write(signal, None, evt, 0)
+
+    def _recordInterrupt(self, who, victim):
+        self._write(interrupt, who, victim, 0)
+
+    def _recordSchedule(self, timer, at, prior):
+        self._write(schedule, timer, None, at)
+
+    def _recordCall(self, timer):
+        self._write(call, timer, None, 0)
+
+    def _recordDispatch(self, command, par):
+        target, arg = decode(command, par[0])
+        self._write(command, par[1], target, arg)
+
+
+def _name(obj):
+    return getattr(obj, 'name', None) or str(obj)
+
+
+def decode(command, whole):
+    """Returns the target (resource, buffer or event) and the numeric
+    argument of yield tuple whole, a command of the given code."""
+    if type(whole[0]) == tuple:
+        # compound yield: the primary command
+        whole = whole[0]
+    target = None
+    arg = 0
+    if command == hold:
+        if len(whole) > 2:
+            arg = whole[2]
+    elif command == waituntil:
+        pass
+    elif len(whole) > 2:
+        target = whole[2]
+        if command in (waitevent, queueevent):
+            if type(target) in (list, tuple):
+                arg = len(target)
+                if target:
+                    target = target[0]
+                else:
+                    target = None
+            else:
+                arg = 1
+        elif command == request:
+            if len(whole) > 3:
+                arg = whole[3]
+        elif command in (get, put):
+            if len(whole) > 3:
+                arg = whole[3]
+                if type(arg) == list:
+                    arg = len(arg)
+            else:
+                arg = 1
+    try:
+        arg = float(arg)
+    except (TypeError, ValueError):
+        arg = 0
+    return target, arg
+
+
+class TraceReader(object):
+    """
+    Reads a trace file written by TraceWriter. Iterating over a TraceReader
+    gives the records as tuples (time, kind, process name, target name,
+    argument); kind is the name of the command or event, the names are None
+    for id 0.
+    """
+    def __init__(self, infile):
+        if hasattr(infile, 'read'):
+            data = infile.read()
+        else:
+            f = open(infile, 'rb')
+            try:
+                data = f.read()
+            finally:
+                f.close()
+        if data[:len(MAGIC)] != MAGIC or data[-len(MAGIC):] != MAGIC:
+            raise ValueError('not a SimPy trace file')
+        end = len(data) - len(MAGIC) - TRAILER.size
+        offset = TRAILER.unpack_from(data, end)[0]
+        self.names = {0: None}
+        count = COUNT.unpack_from(data, offset)[0]
+        pos = offset + COUNT.size
+        for i in range(count):
+            n, length = NAME.unpack_from(data, pos)
+            pos += NAME.size
+            self.names[n] = data[pos:pos + length].decode('utf-8')
+            pos += length
+        self._data = data
+        self._start = len(MAGIC)
+        self.nrRecords = (offset - self._start) // RECORD.size
+
+    def __len__(self):
+        return self.nrRecords
+
+    def __iter__(self):
+        names = self.names
+        unpack = RECORD.unpack_from
+        data = self._data
+        for pos in range(self._start, self._start + self.nrRecords *
+                         RECORD.size, RECORD.size):
+            t, kind, proc, target, arg = unpack(data, pos)
+            yield t, kinds[kind], names[proc], names[target], arg
+
+    def select(self, start = None, end = None, kinds = None, names = None):
+        """Returns an iterator over the records from time start to end of the
+        given kinds, and referencing one of the given names."""
+        for record in self:
+            if start is not None and record[0] < start:
+                continue
+            if end is not None and record[0] > end:
+                break
+            if kinds is not None and not record[1] in kinds:
+                continue
+            if names is not None and not (record[2] in names or
+                                          record[3] in names):
+                continue
+            yield record
+
+
+def formatRecord(record):
+    """Returns a line in the style of SimulationTrace for a record."""
+    t, kind, proc, target, arg = record
+    if kind == 'hold':
+        return '%s hold <%s> delay: %s' % (t, proc, arg)
+    if kind in ('activate', 'reactivate', 'schedule'):
+        return '%s %s <%s> at time: %s' % (t, kind, proc, arg)
+    if kind == 'call':
+        return '%s call <%s>' % (t, proc)
+    if kind == 'terminated':
+        return '%s <%s> terminated' % (t, proc)
+    if kind == 'signal':
+        return '%s event <%s> is signalled' % (t, target)
+    if kind == 'interrupt':
+        return '%s interrupt by: <%s> of: <%s>' % (t, proc, target)
+    if kind in ('request', 'get', 'put'):
+        return '%s %s <%s> <%s> %s' % (t, kind, proc, target, arg)
+    if target is None:
+        return '%s %s <%s>' % (t, kind, proc)
+    return '%s %s <%s> <%s>' % (t, kind, proc, target)
+
+
+def main(argv = None):
+    import argparse
+    parser = argparse.ArgumentParser(
+            description = 'Print or convert a SimPy binary trace file.')
+    parser.add_argument('tracefile')
+    parser.add_argument('--start', type = float, default = None)
+    parser.add_argument('--end', type = float, default = None)
+    parser.add_argument('--kinds', default = None,
+                        help = 'comma separated list of commands or events')
+    parser.add_argument('--names', default = None,
+                        help = 'comma separated list of object names')
+    parser.add_argument('--csv', action = 'store_true',
+                        help = 'write comma separated values')
+    args = parser.parse_args(argv)
+    reader = TraceReader(args.tracefile)
+    records = reader.select(
+            start = args.start, end = args.end,
+            kinds = args.kinds and set(args.kinds.split(',')),
+            names = args.names and set(args.names.split(',')))
+    if args.csv:
+        import csv
+        writer = csv.writer(sys.stdout)
+        writer.writerow(('time', 'kind', 'process', 'target', 'argument'))
+        for record in records:
+            writer.writerow(record)
+    else:
+        for record in records:
+            print(formatRecord(record))
+
+if __name__ == '__main__':
+    main()
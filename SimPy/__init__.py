@@ -18,6 +18,14 @@ Recording - module containing SimPy classes for recording results (Monitor,
         Tally)
 Globals - module providing global Simulation object and the global
         simulation methods
+EventList - module containing the event lists of Simulation (HeapEventList,
+        CalendarQueue)
+Profiler - module containing the Profile collected by Simulation.startProfiling
+TraceFile - module for writing and reading binary traces of a Simulation
+FlightRecorder - module keeping the last events of a Simulation for post-mortem
+        dumps
+ChromeTrace - module exporting process timelines in the Chrome trace-event
+        format
 stepping - a simple interactive debugger
 
 """
@@ -18,13 +18,12 @@ def stepping(glob):
            'p<name>':"skip to event for <name>",'h':"help"}
     evlist = asim._timestamps
     while True:
-        if not evlist:
+        rec = evlist.first() #next event notice which is not cancelled
+        if rec is None:
             print("No more events at t=%s"%asim.now())
             break
-        tEvt = evlist[0][0]
-        who = evlist[0][2]
-        while evlist[0][3]: #skip cancelled event notices
-            step()
+        tEvt = rec[0]
+        who = rec[2]
         print("\nTime now: %s, next event at: t=%s for process: %s "\
               %(asim.now(),tEvt,who.name))
 
@@ -55,7 +54,9 @@ def stepping(glob):
             elif cmd == 'l':
                 print("Events scheduled: \n%s"%asim.allEventNotices())
             elif cmd[0] == 'p':
-                while evlist and evlist[0][2].name != cmd[1:]:
+                rec = evlist.first()
+                while rec is not None and rec[2].name != cmd[1:]:
                     asim.step()
+                    rec = evlist.first()
             else:
                 print("%s not a valid command" % cmd)
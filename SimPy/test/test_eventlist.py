@@ -0,0 +1,102 @@
+# coding=utf-8
+import heapq
+import random
+
+import pytest
+
+from SimPy.EventList import HeapEventList, CalendarQueue
+
+
+@pytest.fixture(params=[HeapEventList, CalendarQueue])
+def evlist(request):
+    return request.param()
+
+class Proc(object):
+    """Stands in for a Process"""
+    _rec = None
+
+def notice(at, sortpr):
+    proc = Proc()
+    proc._rec = (at, sortpr, proc)
+    return proc._rec
+
+def fill(evlist, times):
+    recs = []
+    for i, t in enumerate(times):
+        rec = notice(t, i)
+        evlist.push(rec)
+        recs.append(rec)
+    return recs
+
+def drain(evlist):
+    result = []
+    rec = evlist.popNext()
+    while rec is not None:
+        result.append(rec)
+        rec = evlist.popNext()
+    return result
+
+def test_order(evlist):
+    """Event notices come out ordered by time and priority"""
+    rnd = random.Random(42)
+    recs = fill(evlist, [rnd.choice([0, 0.5, 1, 7, 100]) * rnd.random()
+                         for i in range(1000)])
+    assert len(evlist) == 1000
+    assert evlist.first() == min(recs)
+    assert evlist[0] == min(recs)
+    assert drain(evlist) == sorted(recs)
+    assert len(evlist) == 0
+    assert evlist.first() is None
+
+def test_interleaved(evlist):
+    """Pushing while popping keeps the order (hold model)"""
+    rnd = random.Random(1)
+    ref = HeapEventList()
+    fill(evlist, [rnd.random() for i in range(100)])
+    fill(ref, [rec[0] for rec in sorted(evlist)])
+    for i in range(5000):
+        rec = evlist.popNext()
+        assert rec[0] == ref.popNext()[0]
+        t = rec[0] + rnd.expovariate(1.0)
+        evlist.push(notice(t, 100 + i))
+        ref.push(notice(t, 100 + i))
+
+def test_cancel(evlist):
+    """Cancelled event notices are skipped and can be compacted away"""
+    recs = fill(evlist, range(100))
+    for rec in recs[::2]:
+        evlist.cancel(rec)
+    assert evlist.nrCancelled == 50
+    assert evlist.notices() == recs[1::2]
+    assert evlist.first() is recs[1]
+    assert evlist.nrCancelled == 49
+    evlist.compact()
+    assert evlist.nrCancelled == 0
+    assert len(evlist) == 50
+    assert drain(evlist) == recs[1::2]
+
+def test_lanes(evlist):
+    """Zero-delay notices keep the order of a plain heap"""
+    rnd = random.Random(3)
+    ref = []
+    sortpr = 0
+    now = 0
+    for i in range(5000):
+        if i % 3 == 0:
+            rec = evlist.popNext()
+            if rec is None:
+                assert not ref
+                continue
+            assert rec is heapq.heappop(ref)
+            now = rec[0]
+        else:
+            sortpr -= 1
+            at = rnd.choice([now, now, now + rnd.choice([0.5, 1])])
+            if rnd.random() < 0.3:
+                rec = notice(at, sortpr)
+            else:
+                rec = notice(at, -sortpr)
+            evlist.push(rec)
+            heapq.heappush(ref, rec)
+            assert evlist[0] is ref[0]
+    assert drain(evlist) == sorted(ref)
@@ -60,6 +60,8 @@ class ForEvtTimes(Process):
     'trace',
     # Execute tests using a SimulationRT instance.
     'rt',
+    # Execute tests using a simulation instance with a calendar queue.
+    'calendar',
     # Execute tests using the global simulation object (SimPy 1.x style).
     'global-default',
     # Execute tests using the global SimulationStep object.
@@ -78,6 +80,8 @@ def sim(request):
         return SimulationTrace.SimulationTrace()
     elif request.param == 'rt':
         return SimulationRT.SimulationRT()
+    elif request.param == 'calendar':
+        return Simulation.Simulation(eventListType=CalendarQueue)
     elif request.param.startswith('global'):
         if request.param.endswith('default'):
             Globals.sim = Simulation.Simulation()
@@ -174,6 +178,653 @@ def test_simulation_all_event_times(sim):
    assert(sim.allEventTimes()==[0,1,2]),\
           "allEventTimes not working"
 
+class Rescheduler(Process):
+    """For testing event list compaction
+    """
+    def run(self, sleepers):
+        self.cancelled = []
+        for i in range(20):
+            yield hold,self,1
+            for s in sleepers:
+                self.sim.reactivate(s, delay = 100)
+            self.cancelled.append(self.sim.nrCancelledNotices())
+            assert self.sim.nrLiveNotices() == len(sleepers)
+
+def test_simulation_compaction(sim):
+   """Test that cancelled event notices do not pile up in the event list
+   """
+   sleepers = []
+   for i in range(50):
+       s = P(name="S%s"%i,T=1000,sim=sim)
+       sim.activate(s,s.execute())
+       sleepers.append(s)
+   r = Rescheduler(sim=sim)
+   sim.activate(r,r.run(sleepers))
+   sim.simulate(until=1000)
+   assert max(r.cancelled)<=50,\
+          "cancelled notices not compacted: %s"%max(r.cancelled)
+   assert sim.now()==120,"compaction changed event order: %s"%sim.now()
+   assert sim.nrLiveNotices()==sim.nrCancelledNotices()==0
+
+def test_simulation_double_post(sim):
+   """Test that a notice replacing a live one counts that one as cancelled
+   """
+   p = P(name="P",T=1,sim=sim)
+   sim.activate(p,p.execute())
+   sim._post(p,at=0)
+   assert sim.nrCancelledNotices()==1 and sim.nrLiveNotices()==1
+   assert len(sim._timestamps)==2
+   sim.simulate(until=10)
+   assert sim.nrCancelledNotices()==0,sim.nrCancelledNotices()
+   assert len(sim._timestamps)==0
+   assert p.terminated() and sim.now()==1
+
+class Preemptee(Process):
+    """For testing preemption without Process instantiation
+    """
+    def run(self, res, priority, duration):
+        yield request,self,res,priority
+        yield hold,self,duration
+        yield release,self,res
+        self.tDone = self.sim.now()
+
+class Waker(Process):
+    """For testing reactivation without Process instantiation
+    """
+    def run(self, sleeper):
+        for i in range(5):
+            yield hold,self,1
+            self.sim.reactivate(sleeper, delay = 100)
+
+def test_simulation_reactivate_no_process(sim, monkeypatch):
+   """Test that reactivate and preemption do not instantiate Processes
+   """
+   s = P(name="S",T=1000,sim=sim)
+   sim.activate(s,s.execute())
+   w = Waker(sim=sim)
+   sim.activate(w,w.run(s))
+   res = Resource(capacity=1,preemptable=True,sim=sim)
+   j1 = Preemptee(sim=sim)
+   sim.activate(j1,j1.run(res,1,2))
+   j2 = Preemptee(sim=sim)
+   sim.activate(j2,j2.run(res,2,1),delay=1)
+   def noProcess(*args, **kwargs):
+       raise AssertionError("Process instantiated during the run")
+   monkeypatch.setattr(Process, "__init__", noProcess)
+   sim.simulate(until=1000)
+   assert sim.now()==105
+   assert [j.tDone for j in (j1,j2)]==[3,2]
+
+class CommandUser(Process):
+    """For testing reusable command objects against yield tuples
+    """
+    def run(self, res, lev, sto, log, commands):
+        if commands:
+            h = Hold(self)
+            rq = Request(self, res)
+            rl = Release(self, res)
+            pt = Put(self, lev)
+            g = Get(self, sto, 1)
+        for i in range(3):
+            if commands:
+                yield rq
+                yield h(1)
+                yield rl()
+                yield pt(2)
+                yield g
+            else:
+                yield request,self,res
+                yield hold,self,1
+                yield release,self,res
+                yield put,self,lev,2
+                yield get,self,sto,1
+            log.append((self.name, self.sim.now(), self.got, lev.amount))
+        if commands:
+            yield Passivate(self)
+        else:
+            yield passivate,self
+
+class Feeder(Process):
+    def run(self, sto):
+        for i in range(6):
+            yield hold,self,0.5
+            yield put,self,sto,[i]
+
+def test_simulation_commands(sim):
+   """Test that command objects behave like the yield tuples
+   """
+   logs = []
+   for commands in (False, True):
+       sim.initialize()
+       res = Resource(sim=sim)
+       lev = Level(sim=sim)
+       sto = Store(sim=sim)
+       log = []
+       for i in range(2):
+           u = CommandUser(name="U%s"%i,sim=sim)
+           sim.activate(u,u.run(res,lev,sto,log,commands))
+       f = Feeder(sim=sim)
+       sim.activate(f,f.run(sto))
+       sim.simulate(until=100)
+       logs.append(log)
+       assert u.passive()
+   assert logs[0]==logs[1]
+   assert len(logs[1])==6
+
+def test_simulation_profiling(sim):
+   """Test that profiling counts PEM calls and commands without changing
+   the run
+   """
+   def model():
+       sim.initialize()
+       res = Resource(sim=sim)
+       lev = Level(sim=sim)
+       sto = Store(sim=sim)
+       log = []
+       for i in range(2):
+           u = CommandUser(name="U%s"%i,sim=sim)
+           sim.activate(u,u.run(res,lev,sto,log,i==1))
+       f = Feeder(sim=sim)
+       sim.activate(f,f.run(sto))
+       sim.simulate(until=100)
+       return log
+   log = model()
+   profile = sim.startProfiling()
+   assert model()==log
+   assert sim.stopProfiling() is profile
+   assert 'step' not in sim.__dict__
+   pems = dict([(name, calls) for name, calls, seconds in profile.pemStats()])
+   assert pems=={"CommandUser.run":32,"Feeder.run":13}
+   commands = dict([(command, calls)
+                    for command, calls, seconds in profile.commandStats()])
+   assert commands=={"request":6,"hold":12,"release":6,"put":12,"get":6,
+                     "passivate":2}
+   assert profile.events==45
+   assert profile.eventsPerSecond()>0
+   assert profile.maxNotices==3
+   assert profile.maxCancelledRatio==0
+
+class HookUser(Process):
+    """For testing hooks
+    """
+    def run(self, res, evt, sleeper):
+        yield request,self,res
+        yield hold,self,1
+        self.interrupt(sleeper)
+        evt.signal()
+        yield release,self,res
+
+def test_simulation_hooks(sim):
+   """Test that hooks are called and cost nothing once removed
+   """
+   swapped = ('_post','_terminate','_dispatch')
+   plain = [a for a in swapped if a in sim.__dict__]
+   plainHooks = dict([(k, list(v)) for k, v in sim._hooks.items()])
+   calls = []
+   def recorder(kind):
+       def hook(*args):
+           if kind=='dispatch':
+               names = (args[1][1].name,)
+           elif kind in ('enter','leave'):
+               names = (args[0] is res.waitQ and 'waitQ' or 'activeQ',
+                        args[1].name)
+           else:
+               names = tuple(getattr(a, 'name', a) for a in args)
+           calls.append((kind, sim.now()) + names)
+       return hook
+   hooks = [(kind, recorder(kind)) for kind in sim.hookKinds]
+   for kind, hook in hooks:
+       sim.addHook(kind, hook)
+   res = Resource(name="R",sim=sim)
+   evt = SimEvent(name="E",sim=sim)
+   s = P(name="S",T=10,sim=sim)
+   sim.activate(s,s.execute())
+   u1 = HookUser(name="U1",sim=sim)
+   sim.activate(u1,u1.run(res,evt,s))
+   u2 = HookUser(name="U2",sim=sim)
+   sim.activate(u2,u2.run(res,evt,s))
+   sim.simulate(until=100)
+   assert [c for c in calls if c[0] not in ('dispatch','post')]==[
+       ('activate',0,'S',0,False),('activate',0,'U1',0,False),
+       ('activate',0,'U2',0,False),('enter',0,'activeQ','U1'),
+       ('enter',0,'waitQ','U2'),('interrupt',1,'U1','S'),
+       ('reactivate',1,'S',1,False),('signal',1,'E'),
+       ('leave',1,'activeQ','U1'),('leave',1,'waitQ','U2'),
+       ('enter',1,'activeQ','U2'),('reactivate',1,'U2',1,1),
+       ('terminate',1,'U1'),('terminate',1,'S'),('signal',2,'E'),
+       ('leave',2,'activeQ','U2'),('terminate',2,'U2')]
+   assert [c[2] for c in calls if c[0]=='dispatch']==[
+       'S','U1','U1','U2','U1','U2','U2']
+   assert len([c for c in calls if c[0]=='post'])==11
+   for kind, hook in hooks:
+       sim.removeHook(kind, hook)
+   assert [a for a in swapped if a in sim.__dict__]==plain
+   assert sim._hooks==plainHooks
+
+def test_simulation_tracefile(sim):
+   """Test writing and reading a binary trace
+   """
+   import io
+   from SimPy.TraceFile import TraceWriter, TraceReader
+   plainHooks = dict([(k, list(v)) for k, v in sim._hooks.items()])
+   out = io.BytesIO()
+   writer = TraceWriter(sim, out, bufferSize=100)
+   res = Resource(name="R",sim=sim)
+   evt = SimEvent(name="E",sim=sim)
+   s = P(name="S",T=10,sim=sim)
+   sim.activate(s,s.execute())
+   for i in range(2):
+       u = HookUser(name="U%s"%i,sim=sim)
+       sim.activate(u,u.run(res,evt,s))
+   sim.simulate(until=100)
+   writer.close()
+   reader = TraceReader(io.BytesIO(out.getvalue()))
+   records = list(reader)
+   assert len(records)==writer.nrRecords==len(reader)
+   assert records[:3]==[(0,'activate','S',None,0),(0,'activate','U0',None,0),
+                        (0,'activate','U1',None,0)]
+   assert (0,'request','U0','R',0) in records
+   assert (1,'interrupt','U0','S',0) in records
+   assert (2,'signal',None,'E',0) in records
+   assert records[-1]==(2,'terminated','U1',None,0)
+   assert [r[1] for r in reader.select(start=2,names=['U1'])]==[
+       'release','terminated']
+   assert sim._hooks==plainHooks
+
+class Renamed(Process):
+    """For testing that the trace names a process as it was when it ended
+    """
+    def run(self):
+        yield hold,self,1
+        self.name = "Done"
+
+class Checker(Process):
+    """Calls check after a delay, for looking at a running simulation
+    """
+    def run(self, delay, check):
+        yield hold,self,delay
+        check()
+
+def test_simulation_tracefile_release(sim):
+   """Test that a trace writer does not keep the traced processes alive
+   and names them at termination
+   """
+   import gc, io, weakref
+   from SimPy.TraceFile import TraceWriter, TraceReader
+   out = io.BytesIO()
+   writer = TraceWriter(sim, out)
+   refs = []
+   for i in range(20):
+       p = P(name="P%s"%i,T=1,sim=sim)
+       sim.activate(p,p.execute(),at=i)
+       refs.append(weakref.ref(p))
+   r = Renamed(name="R",sim=sim)
+   sim.activate(r,r.run())
+   del p, r
+   seen = []
+   def check():
+       gc.collect()
+       seen.append((len(writer._ids),refs[0]() is None))
+   c = Checker(name="C",sim=sim)
+   sim.activate(c,c.run(10.5,check))
+   sim.simulate(until=100)
+   # only C and the processes still running, P10 to P19, had ids
+   assert seen==[(11,True)]
+   writer.close()
+   records = list(TraceReader(io.BytesIO(out.getvalue())))
+   assert (1,'terminated','Done',None,0) in records
+   assert (20,'terminated','P19',None,0) in records
+   assert not writer._ids
+
+def test_trace_filters():
+   """Test the process and resource filters of SimulationTrace and that
+   untraced kinds of events are not hooked
+   """
+   try:
+       from StringIO import StringIO
+   except ImportError:
+       from io import StringIO
+   class Out(StringIO):
+       def close(self):
+           # simulate closes the trace file
+           pass
+   sim = SimulationTrace.SimulationTrace()
+   out = Out()
+   sim.trace.tchange(outfile=out,processes=["U0"],resources=["R"])
+   res = Resource(name="R",sim=sim)
+   evt = SimEvent(name="E",sim=sim)
+   s = P(name="S",T=10,sim=sim)
+   sim.activate(s,s.execute())
+   for i in range(2):
+       u = HookUser(name="U%s"%i,sim=sim)
+       sim.activate(u,u.run(res,evt,s))
+   sim.simulate(until=100)
+   lines = [l for l in out.getvalue().split("\n") if not l.startswith(".")]
+   assert lines[:2]==["0 request <U0> <R> priority: default",
+                      "1 release <U0> <R>"]
+   sim.trace.tchange(toTrace=["terminated"],processes=None,resources=None)
+   assert sorted(sim._hooks)==["terminate"]
+   assert "_dispatch" not in sim.__dict__
+   sim.trace.ttext("comment")
+   assert sorted(sim._hooks)==sorted(SimulationTrace.Trace.allHooks)
+   sim.trace.tstop()
+   assert not sim._hooks
+
+class Breaker(Process):
+    """For testing the flight recorder
+    """
+    def run(self, res):
+        yield request,self,res
+        yield hold,self,1
+        yield release,self,res
+        raise ValueError("broken")
+
+def test_simulation_flightrecorder(sim):
+   """Test that the flight recorder dumps the last events when simulate
+   raises an exception
+   """
+   try:
+       from StringIO import StringIO
+   except ImportError:
+       from io import StringIO
+   from SimPy.FlightRecorder import FlightRecorder
+   out = StringIO()
+   recorder = FlightRecorder(sim, size=3, outfile=out)
+   res = Resource(name="R",sim=sim)
+   b = Breaker(name="B",sim=sim)
+   sim.activate(b,b.run(res))
+   with pytest.raises(ValueError):
+       sim.simulate(until=10)
+   assert len(recorder.records)==3
+   assert recorder.lines()==["0 hold <B> delay: 1.0",
+                             "1 post <B> at time: 1","1 release <B> <R>"]
+   assert out.getvalue().split("\n")[2:-1]==recorder.lines()
+   recorder.close()
+   assert "simulate" not in sim.__dict__
+
+def test_simulation_chrometrace(sim):
+   """Test the export of process states as Chrome trace events
+   """
+   import io, json
+   from SimPy.ChromeTrace import ChromeTraceWriter
+   class Out(io.StringIO):
+       def write(self, text):
+           # Python 2 writes str
+           return io.StringIO.write(self, type(u"")(text))
+   out = Out()
+   writer = ChromeTraceWriter(sim, out, timeScale=1)
+   res = Resource(name="R",sim=sim)
+   evt = SimEvent(name="E",sim=sim)
+   s = P(name="S",T=10,sim=sim)
+   sim.activate(s,s.execute())
+   for i in range(2):
+       u = HookUser(name="U%s"%i,sim=sim)
+       sim.activate(u,u.run(res,evt,s))
+   sim.simulate(until=100)
+   writer.close()
+   events = json.loads(out.getvalue())
+   assert len(events)==writer.nrEvents
+   threads = dict([(e["tid"], e["args"]["name"]) for e in events
+                   if e["name"]=="thread_name"])
+   spans = sorted([(threads[e["tid"]], e["ts"], e["name"], e.get("dur", 0))
+                   for e in events if e["ph"] in ("X","i")])
+   assert spans==[("S",0,"holding",1),("S",1,"terminated",0),
+                  ("U0",0,"holding",1),("U0",1,"terminated",0),
+                  ("U1",0,"waitQ R",1),("U1",1,"holding",1),
+                  ("U1",2,"terminated",0)]
+
+class EventReneger(Process):
+    """For testing the Chrome trace of waitevent reneges"""
+    def run(self,res,evt):
+        yield (request,self,res),(waitevent,self,evt)
+        if self.acquired(res):
+            yield hold,self,2
+            yield release,self,res
+
+class EventSignaller(Process):
+    def run(self,evt):
+        yield hold,self,1
+        evt.signal()
+
+def test_simulation_chrometrace_renege(sim):
+   """Test that renege timers do not show up in the Chrome trace
+   """
+   import io, json
+   from SimPy.ChromeTrace import ChromeTraceWriter
+   class Out(io.StringIO):
+       def write(self, text):
+           return io.StringIO.write(self, type(u"")(text))
+   out = Out()
+   writer = ChromeTraceWriter(sim, out, timeScale=1)
+   res = Resource(name="R",sim=sim)
+   evt = SimEvent(name="E",sim=sim)
+   for i in range(3):
+       c = EventReneger(name="C%s"%i,sim=sim)
+       sim.activate(c,c.run(res,evt))
+   s = EventSignaller(name="S",sim=sim)
+   sim.activate(s,s.run(evt))
+   sim.simulate(until=10)
+   assert not writer._current,writer._current
+   writer.close()
+   events = json.loads(out.getvalue())
+   threads = sorted([e["args"]["name"] for e in events
+                     if e["name"]=="thread_name"])
+   assert threads==["C0","C1","C2","S"],threads
+
+def lightModel(base):
+    """Returns process classes of a model using most commands, derived from
+    base (Process or LightProcess)
+    """
+    class Worker(base):
+        if base is LightProcess:
+            __slots__ = ("log",)
+        def __init__(self, name, sim, log):
+            base.__init__(self, name=name, sim=sim)
+            self.log = log
+        def run(self, res, lev, sto, evt, qevt, prio):
+            yield request,self,res,prio
+            yield hold,self,2
+            if self.interrupted():
+                self.log.append((self.sim.now(), self.name, "interrupted"))
+                self.interruptReset()
+            yield release,self,res
+            yield put,self,lev,1
+            yield (get,self,sto,1),(hold,self,1)
+            if self.acquired(sto):
+                self.log.append((self.sim.now(), self.name, self.got))
+            yield waitevent,self,evt
+            self.log.append((self.sim.now(), self.name, self.eventsFired[0].name))
+            yield waituntil,self,lambda: lev.amount>=4
+            self.log.append((self.sim.now(), self.name, "level"))
+            yield queueevent,self,qevt
+            self.log.append((self.sim.now(), self.name, self.eventsFired[0].name))
+            yield passivate,self
+    class Boss(base):
+        def run(self, victim, evt, qevt, sto, lev):
+            yield hold,self,1
+            self.interrupt(victim)
+            yield put,self,sto,["item"]
+            yield hold,self,5
+            evt.signal()
+            yield hold,self,1
+            yield put,self,lev,1
+            for i in range(2):
+                yield hold,self,1
+                qevt.signal()
+    return Worker, Boss
+
+def test_lightprocess(sim):
+   """Test that a LightProcess behaves like a Process
+   """
+   logs = []
+   for base in (Process, LightProcess):
+       sim.initialize()
+       Worker, Boss = lightModel(base)
+       res = Resource(qType=PriorityQ,preemptable=True,sim=sim)
+       lev = Level(sim=sim)
+       sto = Store(getQType=PriorityQ,sim=sim)
+       evt = SimEvent(name="E",sim=sim)
+       qevt = SimEvent(name="Q",sim=sim)
+       log = []
+       workers = []
+       for i in range(3):
+           w = Worker("W%s"%i,sim,log)
+           sim.activate(w,w.run(res,lev,sto,evt,qevt,i))
+           workers.append(w)
+       b = Boss(sim=sim)
+       sim.activate(b,b.run(workers[0],evt,qevt,sto,lev))
+       sim.simulate(until=100)
+       logs.append(log)
+       assert [w.passive() for w in workers]==[True]*3
+       assert lev.amount==4
+       if base is LightProcess:
+           assert not hasattr(workers[0], "__dict__")
+           assert workers[0]._putpriority is None
+           assert workers[2]._priority=={res:2}
+   assert logs[0]==logs[1]
+   assert logs[1]==[(2,"W2",["item"]),(6,"W1","E"),(6,"W2","E"),
+                    (7,"W1","level"),(7,"W2","level"),(8,"W1","Q"),(9,"W2","Q")]
+
+class Ticker(Process):
+    """For testing scheduled calls
+    """
+    def run(self, log):
+        yield hold,self,1
+        log.append((self.sim.now(),"T"))
+
+def test_simulation_schedule(sim):
+   """Test that scheduled calls are ordered like process activations and
+   can be cancelled
+   """
+   try:
+       from StringIO import StringIO
+   except ImportError:
+       from io import StringIO
+   class Out(StringIO):
+       def close(self):
+           # simulate closes the trace file
+           pass
+   out = Out()
+   if isinstance(sim, SimulationTrace.SimulationTrace):
+       sim.trace.tchange(outfile=out,toTrace=["schedule","call"])
+   log = []
+   def again(n):
+       log.append((sim.now(),"again%s"%n))
+       if n:
+           sim.schedule(again,delay=1,args=(n - 1,))
+   t = Ticker(name="T",sim=sim)
+   sim.activate(t,t.run(log))
+   c1 = sim.schedule(log.append,at=1,args=((1,"c1"),),name="c1")
+   c2 = sim.schedule(log.append,delay=1,prior=True,args=((1,"c2"),),
+                     name="c2")
+   c3 = sim.schedule(log.append,at=2,args=((2,"c3"),),name="c3")
+   sim.schedule(again,at=1.5,args=(1,))
+   c3.cancel()
+   assert sim.allEventNotices()=="0: T\n1: c2, c1\n1.5: again\n"
+   sim.simulate(until=10)
+   # T posts its hold at time 0, after c1 was scheduled for time 1
+   assert log==[(1,"c2"),(1,"c1"),(1,"T"),(1.5,"again1"),(2.5,"again0")]
+   c1.cancel()
+   assert sim.nrLiveNotices()==0
+   if isinstance(sim, SimulationTrace.SimulationTrace):
+       assert out.getvalue().split("\n")[:3]==[
+           "0 schedule <c1> at time: 1 prior: False",
+           "0 schedule <c2> at time: 1 prior: True",
+           "0 schedule <c3> at time: 2 prior: False"]
+       assert "1 call <c2>" in out.getvalue()
+       assert "1.5 schedule <again> at time: 2.5 prior: False" in \
+           out.getvalue()
+
+class Arrival(Process):
+    """For testing scheduled arrivals
+    """
+    def visit(self, res, rnd, log):
+        log.append((self.sim.now(),self.name,"arrives"))
+        yield request,self,res
+        yield hold,self,rnd.choice([0.5,1,2])
+        yield release,self,res
+        log.append((self.sim.now(),self.name,"leaves"))
+
+class ArrivalSource(Process):
+    """For testing scheduled arrivals
+    """
+    def generate(self, n, res, rnd, interarrival, log):
+        for i in range(n):
+            c = Arrival(name="C%s"%i,sim=self.sim)
+            self.sim.activate(c,c.visit(res,rnd,log))
+            yield hold,self,interarrival()
+
+def test_simulation_arrivals(sim):
+   """Test that scheduled arrivals are ordered like the arrivals of a source
+   process
+   """
+   import array
+   from random import Random
+   logs = []
+   for form in ("source","interarrival","times","array"):
+       sim.initialize()
+       # service times, and interarrival times with ties
+       rnd = Random(1)
+       draws = Random(2)
+       res = Resource(sim=sim)
+       log = []
+       def interarrival():
+           return draws.choice([0,0.5,1])
+       def factory(i):
+           c = Arrival(name="C%s"%i,sim=sim)
+           return c, c.visit(res,rnd,log)
+       if form == "source":
+           s = ArrivalSource(sim=sim)
+           sim.activate(s,s.generate(20,res,rnd,interarrival,log),at=1)
+       elif form == "interarrival":
+           a = sim.scheduleArrivals(factory,interarrival=interarrival,
+                                    count=20,at=1)
+       else:
+           # the arrival times of the source
+           times = [t for t, name, what in logs[0] if what == "arrives"]
+           if form == "array":
+               times = array.array("d",times)
+           a = sim.scheduleArrivals(factory,times=times)
+       sim.simulate(until=100)
+       logs.append(log)
+       if form != "source":
+           assert a.nrArrived==20 and a.name=="arrivals"
+   assert len(logs[0])==40
+   assert logs[1]==logs[0]
+   assert logs[2]==logs[0]
+   assert logs[3]==logs[0]
+
+def test_simulation_arrivals_times(sim):
+   """Test that scheduleArrivals refuses times before now() or out of
+   order
+   """
+   from random import Random
+   res = Resource(sim=sim)
+   def factory(i):
+       c = Arrival(name="C%s"%i,sim=sim)
+       return c, c.visit(res,Random(0),[])
+   s = P(name="S",T=5,sim=sim)
+   sim.activate(s,s.execute())
+   sim.simulate(until=2)
+   with pytest.raises(FatalSimerror) as e:
+       sim.scheduleArrivals(factory,times=[1,3])
+   assert "times" in str(e.value) and "before now()" in str(e.value)
+   with pytest.raises(FatalSimerror) as e:
+       sim.scheduleArrivals(factory,times=(3,5,4))
+   assert "times is not ascending: 4 comes after 5" in str(e.value)
+   # an iterator is checked as its times are taken
+   with pytest.raises(FatalSimerror) as e:
+       sim.scheduleArrivals(factory,times=iter([1]))
+   assert "before now()" in str(e.value)
+   sim.initialize()
+   sim.scheduleArrivals(factory,times=(t for t in [3,5,4]))
+   try:
+       # SimulationRT returns the message
+       message = sim.simulate(until=10)
+   except FatalSimerror as error:
+       message = str(error)
+   assert "times is not ascending: 4 comes after 5" in message
+
 # Resource tests
 # --------------
 
@@ -319,6 +970,179 @@ def test_resource_request_priority(sim):
     assert sorted(qp),"waitQ not sorted by priority: %s"\
                        %str([(x.name,x._priority[Rp]) for x in Rp.waitQ])
 
+def test_priorityq_order(sim):
+    """Test that PriorityQ keeps the order of a list sorted by insertion
+    after all requests of higher or equal priority"""
+    from random import Random
+    rnd = Random(3)
+    res = Resource(capacity=0,qType=PriorityQ,sim=sim)
+    q = res.waitQ
+    ref = []
+    objs = []
+    for i in range(300):
+        op = rnd.random()
+        if op < 0.6 or not ref:
+            obj = Process(name="p%s"%i,sim=sim)
+            obj._priority = {res:rnd.choice([0,1,1,2,5])}
+            q.enter(obj)
+            z = 0
+            while z < len(ref) and ref[z]._priority[res] >= obj._priority[res]:
+                z += 1
+            ref.insert(z, obj)
+        elif op < 0.8:
+            assert q.leave() is ref.pop(0)
+        elif op < 0.9:
+            obj = rnd.choice(ref)
+            q.takeout(obj)
+            ref.remove(obj)
+            assert not obj in q
+        else:
+            # a preempted process has the highest priority of the queue
+            obj = Process(name="p%s"%i,sim=sim)
+            obj._priority = {res:ref[0]._priority[res]}
+            q.enterFront(obj)
+            ref.insert(0, obj)
+        assert list(q)==ref
+        assert len(q._keys)==len(q._key)==len(ref)
+    with pytest.raises(ValueError):
+        q.remove(Process(sim=sim))
+
+def test_priorityq_list_methods(sim):
+    """Test that deleting entries of a PriorityQ keeps its keys and that
+    the list methods which would break its order are refused"""
+    res = Resource(capacity=0,qType=PriorityQ,sim=sim)
+    q = res.waitQ
+    procs = [Process(name="p%s"%i,sim=sim) for i in range(6)]
+    for i, p in enumerate(procs):
+        p._priority = {res:i%3}
+        q.enter(p)
+    ref = list(q)
+    del q[1]
+    del ref[1]
+    del q[-2:]
+    del ref[-2:]
+    assert list(q)==ref
+    assert len(q._keys)==len(q._key)==len(ref)
+    for p in ref:
+        assert p in q
+    new = Process(name="new",sim=sim)
+    for change in (lambda: q.append(new), lambda: q.insert(0,new),
+                   lambda: q.extend([new]), lambda: q.sort(),
+                   lambda: q.reverse(), lambda: q.__setitem__(0,new),
+                   lambda: q.__setitem__(slice(0,1),[new]),
+                   lambda: q.__iadd__([new])):
+        with pytest.raises(TypeError):
+            change()
+    assert list(q)==ref
+    new._priority = {res:1}
+    q.enter(new)
+    assert list(q)==ref+[new]
+    q.clear()
+    assert not q and not q._keys and not q._key
+
+class DoubleRequester(Process):
+    """For testing a process which holds two units of a resource
+    """
+    def run(self, res, log):
+        yield request,self,res
+        yield request,self,res
+        yield hold,self,1
+        yield release,self,res
+        log.append((self in res.activeQ, len(res.activeQ)))
+        yield release,self,res
+        log.append((self in res.activeQ, len(res.activeQ)))
+
+def test_priorityq_double_request(sim):
+    """Test that a process can hold two units of a resource with a
+    PriorityQ and release both"""
+    res = Resource(capacity=2,qType=PriorityQ,sim=sim)
+    log = []
+    p = DoubleRequester(sim=sim)
+    sim.activate(p,p.run(res,log))
+    sim.simulate(until=10)
+    assert log==[(True,1),(False,0)]
+    assert not res.activeQ._key and not res.activeQ._keys
+    q = res.waitQ
+    for prio in (1,0,2):
+        p._priority = {res:prio}
+        q.enter(p)
+    assert q._key[p]==sorted(q._keys)
+    del q[1]
+    q.remove(p)
+    assert list(q)==[p] and q._key[p]==q._keys[0]
+    q.pop()
+    assert p not in q and not q._key
+
+def test_preemptable_fifo_double_request(sim):
+    """Test that a process can hold two units of a preemptable FIFO
+    resource and release both"""
+    res = Resource(capacity=2,preemptable=True,sim=sim)
+    log = []
+    p = DoubleRequester(sim=sim)
+    sim.activate(p,p.run(res,log))
+    sim.simulate(until=10)
+    assert log==[(True,1),(False,0)]
+
+def test_linkedfifo(sim):
+    """Test that LinkedFIFO behaves like a FIFO list"""
+    from random import Random
+    rnd = Random(4)
+    res = Resource(capacity=0,qType=LinkedFIFO,sim=sim)
+    q = res.waitQ
+    ref = []
+    procs = [Process(name="p%s"%i,sim=sim) for i in range(20)]
+    for i in range(300):
+        op = rnd.random()
+        if op < 0.5 or not ref:
+            obj = rnd.choice(procs)
+            q.enter(obj)
+            ref.append(obj)
+        elif op < 0.7:
+            assert q.leave() is ref.pop(0)
+        elif op < 0.9:
+            obj = rnd.choice(ref)
+            q.takeout(obj)
+            ref.remove(obj)
+        else:
+            obj = rnd.choice(procs)
+            q.enterFront(obj)
+            ref.insert(0, obj)
+        assert q==ref and len(q)==len(ref)
+        if ref:
+            assert q[0] is ref[0] and q[-1] is ref[-1]
+            assert q[len(ref)//2] is ref[len(ref)//2]
+            assert q[1:3]==ref[1:3] and ref[0] in q
+    with pytest.raises(ValueError):
+        q.remove(Process(sim=sim))
+
+def test_resource_holders(sim):
+    """Test that a preemptable Resource preempts its lowest priority holder
+    whatever its qType, and that FIFO holders are released in any order"""
+    class Holder(Process):
+        def run(self, res, priority, t, log):
+            yield request,self,res,priority
+            log.append((self.sim.now(),self.name,"gets"))
+            yield hold,self,t
+            yield release,self,res
+            log.append((self.sim.now(),self.name,"releases"))
+    log = []
+    res = Resource(capacity=2,preemptable=True,sim=sim)
+    for name, priority, delay in (("low",1,0),("high",5,0),("mid",3,1)):
+        h = Holder(name=name,sim=sim)
+        sim.activate(h,h.run(res,priority,10,log),delay=delay)
+    farm = Resource(capacity=100,sim=sim)
+    holders = []
+    for i in range(100):
+        h = Holder(name="H%s"%i,sim=sim)
+        sim.activate(h,h.run(farm,0,100 - i,[]))
+        holders.append(h)
+    sim.simulate(until=20)
+    assert farm.activeQ==holders[:80]
+    # low is preempted at 1 and resumes its hold when high releases
+    assert log==[(0,"low","gets"),(0,"high","gets"),(1,"mid","gets"),
+                 (10,"high","releases"),(11,"mid","releases"),
+                 (19,"low","releases")]
+
 def test_resource_request_priority_1(sim):
     """Test PriorityQ, with no preemption, capacity == 1"""
     class Job(Process):
@@ -967,6 +1791,66 @@ def test_waituntil(sim):
      sim.activate(s,s.makeconditions(w))
      sim.simulate(until=5)
 
+class Gauge(Process):
+    reading=Watched(0)
+    def rise(self,lev,sto):
+        for i in range(1,4):
+            yield hold,self,1
+            self.reading=i
+        yield put,self,lev,5
+        yield put,self,sto,["a","b"]
+
+class Watcher(Process):
+    def __init__(self,sim=None):
+        Process.__init__(self,sim=sim)
+        self.woken=None
+    def watch(self,cond,watched):
+        yield waituntil,self,cond,watched
+        self.woken=self.sim.now()
+
+def test_waituntil_watched(sim):
+    """Tests waituntil conditions re-tested only when watched objects change
+    """
+    lev=Level(sim=sim)
+    sto=Store(sim=sim)
+    g=Gauge(sim=sim)
+    sim.activate(g,g.rise(lev,sto))
+    conds=[(lambda:g.reading>=2,g),
+           (lambda:lev.amount==5,lev),
+           (lambda:sto.nrBuffered==2,[lev,sto]),
+           (lambda:g.reading>=2,lev)]
+    watchers=[]
+    for cond,watched in conds:
+        w=Watcher(sim=sim)
+        sim.activate(w,w.watch(cond,watched))
+        watchers.append(w)
+    sim.simulate(until=10)
+    assert [w.woken for w in watchers]==[2,3,3,3]
+    assert not sim.condQ
+    assert not sim._watchers
+
+def test_waituntil_changed(sim):
+    """Tests that changed() triggers a test of the watched conditions only
+    """
+    state={"go":False}
+    tested=[]
+    def cond():
+        tested.append(sim.now())
+        return state["go"]
+    class Setter(Process):
+        def run(self):
+            yield hold,self,1
+            state["go"]=True
+            yield hold,self,1
+            sim.changed(state)
+    w=Watcher(sim=sim)
+    sim.activate(w,w.watch(cond,state))
+    s=Setter(sim=sim)
+    sim.activate(s,s.run())
+    sim.simulate(until=10)
+    assert w.woken==2
+    assert tested==[0,2]
+
 # Compound "yield request" tests
 # ------------------------------
 #
@@ -1326,6 +2210,31 @@ def test_wait_event_2M(sim):
         "job waiting or using resource"
     assert res.waitMon==[[0,0],[0,1],[eventtime,0]],"res.waitMon is wrong: %s"%res.waitMon
 
+def test_renege_no_process(sim, monkeypatch):
+    """Test that renege conditions do not instantiate helper Processes
+    """
+    res=Resource(name="Server",capacity=1,sim=sim)
+    event=SimEvent("Renege_trigger",sim=sim)
+    j1=JobTO(server=res,name="Job_1",sim=sim)
+    sim.activate(j1,j1.execute(timeout=10,usetime=5))
+    j2=JobTO(server=res,name="Job_2",sim=sim)
+    sim.activate(j2,j2.execute(timeout=2,usetime=5))
+    j3=JobEvt(server=res,name="Job_3",sim=sim)
+    sim.activate(j3,j3.execute(event=event,usetime=5))
+    j4=JobEvt(server=res,name="Job_4",sim=sim)
+    sim.activate(j4,j4.execute(event=event,usetime=5))
+    f=FireEvent(name="FireEvent",sim=sim)
+    sim.activate(f,f.fire(fireDelay=3,event=event))
+    def noProcess(*args, **kwargs):
+        raise AssertionError("Process instantiated during the run")
+    monkeypatch.setattr(Process, "__init__", noProcess)
+    sim.simulate(until=20)
+    assert [j.gotResource for j in (j1,j2,j3,j4)]==[True,False,False,False]
+    assert sim.now()==5
+    assert not (res.waitQ or res.activeQ),\
+        "job waiting or using resource"
+    assert sim.nrLiveNotices()==0
+
 # Compound "yield request" tests
 # ------------------------------
 #
@@ -1768,6 +2677,179 @@ def test_buffer_filter(sim):
     sim.activate(fc,fc.getItems(store=st,a=minw,b=maxw))
     sim.simulate(until=1)
 
+class DequeUser(Process):
+    """Used in test_deque_store"""
+    def put(self,store,items,log):
+        for i in range(0,len(items),3):
+            yield put,self,store,items[i:i+3]
+            log.append((self.sim.now(),self.name,"put",items[i:i+3]))
+            yield hold,self,1
+    def get(self,store,what,log):
+        for i in range(4):
+            yield get,self,store,what
+            log.append((self.sim.now(),self.name,"got",self.got))
+            yield hold,self,2
+
+def test_deque_store(sim):
+    """DequeStore: gets and puts, blocked or not, with numbers and filter
+    functions happen as for a Store"""
+    def odd(buff):
+        return [x for x in buff[:4] if x%2]
+    def run(storeType):
+        log=[]
+        store=storeType(capacity=5,initialBuffered=[100,101],sim=sim)
+        p=DequeUser(name="p",sim=sim)
+        sim.activate(p,p.put(store,list(range(30)),log))
+        for name,what in (("one",1),("two",2),("odd",odd)):
+            c=DequeUser(name=name,sim=sim)
+            sim.activate(c,c.get(store,what,log))
+        sim.simulate(until=100)
+        return log,store
+    sim.initialize()
+    expected,store=run(Store)
+    sim.initialize()
+    log,dstore=run(DequeStore)
+    assert log==expected,"%s != %s"%(log,expected)
+    assert dstore.buffered==store.buffered and dstore.nrBuffered==5,\
+        "wrong buffer: %s"%dstore.buffered
+    assert dstore.theBuffer[1:]==store.theBuffer[1:]
+    assert dstore.theBuffer[-1]==store.theBuffer[-1]
+    with pytest.raises(FatalSimerror):
+        dstore.addSort(mySortFunc)
+
+def test_priority_store(sim):
+    """PriorityStore: items are got in the order of their key, or of the
+    sort function added by addSort, as from a sorted Store"""
+    def heavy(buff):
+        return [x for x in buff if x.weight>6]
+    def run(store):
+        log=[]
+        p=DequeUser(name="p",sim=sim)
+        items=[Widget(weight=w) for w in (9,1,8,2,7,3,6,4,5,0,9,1)]
+        sim.activate(p,p.put(store,items,log))
+        for name,what in (("one",1),("two",2),("heavy",heavy)):
+            c=DequeUser(name=name,sim=sim)
+            sim.activate(c,c.get(store,what,log),at=1)
+        sim.simulate(until=100)
+        return [(t,name,cmd,[x.weight for x in its]) for t,name,cmd,its in log]
+    sim.initialize()
+    store=Store(capacity=4,sim=sim)
+    store.addSort(mySortFunc)
+    expected=run(store)
+    sim.initialize()
+    pstore=PriorityStore(capacity=4,key=lambda x:x.weight,sim=sim)
+    assert run(pstore)==expected
+    assert [x.weight for x in pstore.buffered]==\
+        [x.weight for x in store.buffered]
+    sim.initialize()
+    pstore=PriorityStore(capacity=4,sim=sim)
+    pstore.addSort(mySortFunc)
+    assert run(pstore)==expected
+
+    # Equal keys in FIFO order; addSort reorders the buffer
+    items=[Widget(weight=w) for w in (3,1,3,2,1)]
+    pstore=PriorityStore(key=lambda x:x.weight,initialBuffered=items,sim=sim)
+    assert pstore.theBuffer==[items[1],items[4],items[3],items[0],items[2]]
+    assert pstore.nrBuffered==5
+    pstore.addSort(lambda self,par:sorted(par,key=lambda x:-x.weight))
+    assert pstore.theBuffer==[items[0],items[2],items[3],items[1],items[4]]
+
+class KeyUser(Process):
+    """Used in test_keyed_store"""
+    def put(self,store,batches,log):
+        for batch in batches:
+            yield hold,self,1
+            yield put,self,store,batch
+            log.append((self.sim.now(),self.name,"put",batch))
+    def get(self,store,what,n,log):
+        for i in range(n):
+            yield get,self,store,what
+            log.append((self.sim.now(),self.name,"got",self.got))
+    def renege(self,store,what,log):
+        yield (get,self,store,what),(hold,self,2)
+        log.append((self.sim.now(),self.name,"got",self.acquired(store)))
+
+def test_keyed_store(sim):
+    """KeyedStore: a put serves the getters waiting for the key of its
+    items, per key in FIFO order, then the other getters"""
+    log=[]
+    store=KeyedStore(key=lambda part:part[0],initialBuffered=[("d",0)],
+                     sim=sim)
+    for name,what,n in (("a",ByKey("a"),2),("ab",ByKey("a","b"),2),
+                        ("two",2,1)):
+        c=KeyUser(name=name,sim=sim)
+        sim.activate(c,c.get(store,what,n,log))
+    r=KeyUser(name="c",sim=sim)
+    sim.activate(r,r.renege(store,ByKey("c"),log))
+    p=KeyUser(name="p",sim=sim)
+    sim.activate(p,p.put(store,[[("b",1)],[("a",2),("a",3)],
+                                [("c",4),("a",5)],[("b",6),("c",7)]],log))
+    c=KeyUser(name="cb",sim=sim)
+    sim.activate(c,c.get(store,ByKey("c","b"),1,log),at=5)
+    sim.simulate(until=10)
+    assert log==[(1,"p","put",[("b",1)]),
+                 (1,"ab","got",[("b",1)]),
+                 (2,"p","put",[("a",2),("a",3)]),
+                 (2,"c","got",0),
+                 (2,"a","got",[("a",2)]),
+                 (2,"ab","got",[("a",3)]),
+                 (3,"p","put",[("c",4),("a",5)]),
+                 (3,"a","got",[("a",5)]),
+                 (3,"two","got",[("d",0),("c",4)]),
+                 (4,"p","put",[("b",6),("c",7)]),
+                 (5,"cb","got",[("b",6)])],log
+    assert store.theBuffer==[("c",7)] and store.nrBuffered==1
+    assert not store.getQ
+
+class Receiver(Process):
+    """Used in test_mailbox"""
+    def __init__(self,name,sim):
+        Process.__init__(self,name=name,sim=sim)
+        self.inbox=Mailbox(name="inbox of %s"%name,monitored=True,sim=sim)
+    def receive(self,timeout,log):
+        while True:
+            yield (get,self,self.inbox),(hold,self,timeout)
+            if self.acquired(self.inbox):
+                log.append((self.sim.now(),self.name,self.got[0]))
+            else:
+                log.append((self.sim.now(),self.name,"timeout"))
+    def receiveAll(self,log):
+        g=Get(self,self.inbox)
+        while True:
+            yield g()
+            log.append((self.sim.now(),self.name,self.got[0]))
+
+class Sender(Process):
+    """Used in test_mailbox"""
+    def send(self,to,messages):
+        for message in messages:
+            yield hold,self,1
+            to.inbox.deliver(message)
+
+def test_mailbox(sim):
+    """Mailbox: a delivered message wakes the waiting receiver at once;
+    receiving with a timeout; monitoring of the number of messages"""
+    log=[]
+    a=Receiver("a",sim=sim)
+    sim.activate(a,a.receive(timeout=1.5,log=log))
+    b=Receiver("b",sim=sim)
+    sim.activate(b,b.receiveAll(log),at=2.5)
+    s=Sender(sim=sim)
+    sim.activate(s,s.send(a,["a1","a2"]))
+    s=Sender(sim=sim)
+    sim.activate(s,s.send(b,["b1","b2","b3"]))
+    sim.schedule(a.inbox.deliver,at=4,args=("a3",))
+    sim.simulate(until=5)
+    assert log==[(1,"a","a1"),(2,"a","a2"),(2.5,"b","b1"),(2.5,"b","b2"),
+                 (3,"b","b3"),(3.5,"a","timeout"),(4,"a","a3")],log
+    assert b.inbox.name=="inbox of b" and not b.inbox.nrBuffered
+    assert a.inbox.bufferMon==[[0,0],[1,1],[1,0],[2,1],[2,0],[4,1],[4,0]],\
+        a.inbox.bufferMon
+    full=Mailbox(capacity=1,initialBuffered=["x"],sim=sim)
+    assert full.name=="a_mailbox"
+    with pytest.raises(FatalSimerror):
+        full.deliver("y")
+
 ## ------------------------------------------------------------------
 ##
 ##  Store: Tests for compound get/put
@@ -0,0 +1,81 @@
+# coding=utf-8
+"""
+Compares a source process with Simulation.scheduleArrivals for the arrivals
+of customers who hold for an exponential service time and terminate.
+
+- source: a Source process creates and activates each customer and holds
+  for an exponential interarrival time.
+- interarrival: scheduleArrivals with the same interarrival distribution.
+- times: scheduleArrivals with the arrival times generated beforehand.
+
+The measurement reports the best arrivals per second of three alternating
+runs of each form.
+
+Usage: python benchmarks/arrivals.py [arrivals]
+
+"""
+from __future__ import print_function
+
+import gc
+import os
+import random
+import sys
+import time
+
+# Import the SimPy package of this checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SimPy.Simulation import Simulation, Process, hold
+
+
+class Customer(Process):
+    def visit(self, rnd):
+        yield hold, self, rnd.expovariate(1.0)
+
+
+class Source(Process):
+    def generate(self, n, rnd):
+        sim = self.sim
+        for i in range(n):
+            c = Customer(name='Customer', sim=sim)
+            sim.activate(c, c.visit(rnd))
+            yield hold, self, rnd.expovariate(2.0)
+
+
+def run(arrivals, form):
+    rnd = random.Random(0)
+    sim = Simulation()
+
+    def factory(i):
+        c = Customer(name='Customer', sim=sim)
+        return c, c.visit(rnd)
+    if form == 'times':
+        times = []
+        t = 0
+        draws = random.Random(1)
+        for i in range(arrivals):
+            times.append(t)
+            t += draws.expovariate(2.0)
+    start = time.time()
+    if form == 'source':
+        s = Source(sim=sim)
+        sim.activate(s, s.generate(arrivals, rnd))
+    elif form == 'interarrival':
+        sim.scheduleArrivals(factory, count=arrivals,
+                             interarrival=lambda: rnd.expovariate(2.0))
+    else:
+        sim.scheduleArrivals(factory, times=times)
+    sim.simulate(until=1e100)
+    return arrivals / (time.time() - start)
+
+
+if __name__ == '__main__':
+    arrivals = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    forms = ('source', 'interarrival', 'times')
+    best = dict([(form, 0) for form in forms])
+    for i in range(3):
+        for form in forms:
+            gc.collect()
+            best[form] = max(best[form], run(arrivals, form))
+    for form in forms:
+        print('%-13s %9.0f arrivals/s' % (form, best[form]))
@@ -0,0 +1,78 @@
+# coding=utf-8
+"""
+Compares yield tuples with reusable command objects.
+
+- hold: n processes loop over 'yield hold, self, 1' or 'yield h(1)'.
+- request: n processes share a Resource and loop over request, hold and
+  release, as tuples or as Request, Hold and Release command objects.
+
+Reports events per second for both forms.
+
+Usage: python benchmarks/commands.py [events]
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+# Import the SimPy package of this checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SimPy.Simulation import Simulation, Process, Resource, hold, request, \
+        release, Hold, Request, Release
+
+
+class Holder(Process):
+    def tuples(self):
+        while True:
+            yield hold, self, 1
+
+    def commands(self):
+        h = Hold(self)
+        while True:
+            yield h(1)
+
+
+class User(Process):
+    def tuples(self, res):
+        while True:
+            yield request, self, res
+            yield hold, self, 1
+            yield release, self, res
+
+    def commands(self, res):
+        rq = Request(self, res)
+        h = Hold(self, 1)
+        rl = Release(self, res)
+        while True:
+            yield rq
+            yield h
+            yield rl
+
+
+def run(model, form, events, n=100):
+    sim = Simulation()
+    res = Resource(capacity=n // 2, sim=sim)
+    for i in range(n):
+        if model == 'hold':
+            p = Holder(sim=sim)
+            pem = getattr(p, form)()
+        else:
+            p = User(sim=sim)
+            pem = getattr(p, form)(res)
+        sim.activate(p, pem)
+    step = sim.step
+    start = time.time()
+    for i in range(events):
+        step()
+    return events / (time.time() - start)
+
+
+if __name__ == '__main__':
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    for model in ('hold', 'request'):
+        for form in ('tuples', 'commands'):
+            print('%-8s %-9s %9.0f events/s' % (
+                model, form, run(model, form, events)))
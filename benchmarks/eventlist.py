@@ -0,0 +1,91 @@
+# coding=utf-8
+"""
+Compares the event list backends of SimPy.Simulation.
+
+Two measurements are taken for a growing number n of pending event notices:
+
+- hold: the classic hold model on the bare event list. Each operation pops
+  the next notice and pushes it again at an exponentially distributed
+  distance into the future, so the list size stays at n.
+- sim: a Simulation with n processes which each loop over
+  'yield hold, self, expovariate(1)'. The model runs 2n events before the
+  measurement starts, so that the event list has settled.
+
+Usage: python benchmarks/eventlist.py [operations]
+
+"""
+from __future__ import print_function
+
+import os
+import random
+import sys
+import time
+
+# Import the SimPy package of this checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SimPy.Simulation import (Simulation, Process, hold, HeapEventList,
+                              CalendarQueue)
+
+BACKENDS = [HeapEventList, CalendarQueue]
+SIZES = [10, 100, 1000, 10000, 100000, 1000000]
+
+
+class Notice(object):
+    """Stands in for a process: the event list drops notices which are not
+    its _rec."""
+    __slots__ = ('_rec',)
+
+
+def bench_hold(eventListType, n, ops):
+    rnd = random.Random(0)
+    evlist = eventListType()
+    for i in range(n):
+        proc = Notice()
+        proc._rec = rec = (rnd.expovariate(1.0), i, proc)
+        evlist.push(rec)
+    sortpr = n
+    start = time.time()
+    for i in range(ops):
+        rec = evlist.popNext()
+        sortpr += 1
+        proc = rec[2]
+        proc._rec = rec = (rec[0] + rnd.expovariate(1.0), sortpr, proc)
+        evlist.push(rec)
+    return ops / (time.time() - start)
+
+
+class Holder(Process):
+    def run(self, rnd):
+        while True:
+            yield hold, self, rnd.expovariate(1.0)
+
+
+def bench_sim(eventListType, n, ops):
+    rnd = random.Random(0)
+    sim = Simulation(eventListType=eventListType)
+    for i in range(n):
+        h = Holder(sim=sim)
+        sim.activate(h, h.run(rnd))
+    step = sim.step
+    for i in range(2 * n):
+        step()
+    start = time.time()
+    for i in range(ops):
+        step()
+    return ops / (time.time() - start)
+
+
+def main(ops):
+    print('operations per second (%s operations)' % ops)
+    print('%-6s %9s' % ('bench', 'n') +
+          ''.join(['%16s' % b.__name__ for b in BACKENDS]))
+    for name, bench in [('hold', bench_hold), ('sim', bench_sim)]:
+        for n in SIZES:
+            rates = [bench(b, n, ops) for b in BACKENDS]
+            print('%-6s %9d' % (name, n) +
+                  ''.join(['%16.0f' % r for r in rates]))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200000)
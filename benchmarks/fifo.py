@@ -0,0 +1,59 @@
+# coding=utf-8
+"""
+Compares the FIFO and LinkedFIFO queue disciplines for a Resource with a
+long waitQ.
+
+n customers request a Resource of capacity 10 at time 0 and renege after an
+exponential patience; those served hold it for one time unit. The
+measurement reports the best customers per second of three alternating runs
+of both queues.
+
+Usage: python benchmarks/fifo.py [n ...]
+
+"""
+from __future__ import print_function
+
+import gc
+import os
+import random
+import sys
+import time
+
+# Import the SimPy package of this checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SimPy.Simulation import Simulation, Process, Resource, FIFO, \
+        LinkedFIFO, request, release, hold
+
+
+class Customer(Process):
+    def visit(self, res, patience):
+        yield (request, self, res), (hold, self, patience)
+        if self.acquired(res):
+            yield hold, self, 1
+            yield release, self, res
+
+
+def run(n, qType):
+    rnd = random.Random(0)
+    sim = Simulation()
+    res = Resource(capacity=10, qType=qType, sim=sim)
+    for i in range(n):
+        c = Customer(sim=sim)
+        sim.activate(c, c.visit(res, rnd.expovariate(10.0 / n)))
+    start = time.time()
+    sim.simulate(until=1e100)
+    return n / (time.time() - start)
+
+
+if __name__ == '__main__':
+    sizes = [int(n) for n in sys.argv[1:]] or [1000, 10000, 50000]
+    for n in sizes:
+        best = {FIFO: 0, LinkedFIFO: 0}
+        for i in range(3):
+            for qType in (FIFO, LinkedFIFO):
+                gc.collect()
+                best[qType] = max(best[qType], run(n, qType))
+        for qType in (FIFO, LinkedFIFO):
+            print('%6s %-11s %9.0f customers/s' % (n, qType.__name__,
+                                                   best[qType]))
@@ -0,0 +1,64 @@
+# coding=utf-8
+"""
+Measures releases from a Resource with many units, comparing the list-based
+activeQ (FIFO) with the LinkedFIFO a FIFO Resource now keeps its holders in.
+
+A server farm of n units is used by n workers, each of which repeatedly
+requests a unit, holds it for an exponential time and releases it, for 20
+time units. The measurement reports the best releases per second of three
+alternating runs of both forms.
+
+Usage: python benchmarks/holders.py [n ...]
+
+"""
+from __future__ import print_function
+
+import gc
+import os
+import random
+import sys
+import time
+
+# Import the SimPy package of this checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SimPy.Simulation import Simulation, Process, Resource, FIFO, \
+        request, release, hold
+
+
+class Worker(Process):
+    def run(self, farm, rnd, count):
+        while True:
+            yield request, self, farm
+            yield hold, self, rnd.expovariate(1.0)
+            yield release, self, farm
+            count[0] += 1
+
+
+def run(n, listed):
+    rnd = random.Random(0)
+    sim = Simulation()
+    farm = Resource(capacity=n, sim=sim)
+    if listed:
+        # the activeQ as it used to be
+        farm.activeQ = FIFO(farm, None)
+    count = [0]
+    for i in range(n):
+        w = Worker(sim=sim)
+        sim.activate(w, w.run(farm, rnd, count))
+    start = time.time()
+    sim.simulate(until=20)
+    return count[0] / (time.time() - start)
+
+
+if __name__ == '__main__':
+    sizes = [int(n) for n in sys.argv[1:]] or [100, 1000, 5000]
+    for n in sizes:
+        best = {True: 0, False: 0}
+        for i in range(3):
+            for listed in (True, False):
+                gc.collect()
+                best[listed] = max(best[listed], run(n, listed))
+        for listed in (True, False):
+            print('%5s %-10s %9.0f releases/s' % (
+                  n, listed and 'FIFO' or 'LinkedFIFO', best[listed]))
@@ -0,0 +1,85 @@
+# coding=utf-8
+"""
+Compares typed consumers of a Store, getting with a filter function, with
+those of a KeyedStore, getting with ByKey.
+
+n consumers each want parts of one of n // 10 types; the part is used for
+an exponential time. A producer puts one part of a random type per 0.01
+time units, for 20 time units. The measurement reports the best parts per
+second of three alternating runs of both forms.
+
+Usage: python benchmarks/keyedstore.py [n ...]
+
+"""
+from __future__ import print_function
+
+import gc
+import os
+import random
+import sys
+import time
+
+# Import the SimPy package of this checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SimPy.Simulation import Simulation, Process, Store, KeyedStore, ByKey, \
+        get, put, hold
+
+
+class Part(object):
+    def __init__(self, kind):
+        self.kind = kind
+
+
+class Producer(Process):
+    def produce(self, store, rnd, nrKinds):
+        while True:
+            yield put, self, store, [Part(rnd.randrange(nrKinds))]
+            yield hold, self, 0.01
+
+
+class Consumer(Process):
+    def consume(self, store, kind, rnd, keyed):
+        if keyed:
+            what = ByKey(kind)
+        else:
+            def what(buff):
+                for part in buff:
+                    if part.kind == kind:
+                        return [part]
+                return []
+        while True:
+            yield get, self, store, what
+            yield hold, self, rnd.expovariate(1.0)
+
+
+def run(n, keyed):
+    rnd = random.Random(0)
+    sim = Simulation()
+    if keyed:
+        store = KeyedStore(key=lambda part: part.kind, sim=sim)
+    else:
+        store = Store(sim=sim)
+    nrKinds = max(n // 10, 1)
+    for i in range(n):
+        c = Consumer(sim=sim)
+        sim.activate(c, c.consume(store, i % nrKinds, rnd, keyed))
+    p = Producer(sim=sim)
+    sim.activate(p, p.produce(store, rnd, nrKinds))
+    start = time.time()
+    sim.simulate(until=20)
+    return 2000 / (time.time() - start)
+
+
+if __name__ == '__main__':
+    sizes = [int(n) for n in sys.argv[1:]] or [100, 1000, 5000]
+    for n in sizes:
+        best = {False: 0, True: 0}
+        for i in range(3):
+            for keyed in (False, True):
+                gc.collect()
+                best[keyed] = max(best[keyed], run(n, keyed))
+        for keyed in (False, True):
+            print('%5s %-18s %9.0f parts/s' % (
+                  n, keyed and 'KeyedStore+ByKey' or 'Store+filter',
+                  best[keyed]))
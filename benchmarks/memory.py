@@ -0,0 +1,76 @@
+# coding=utf-8
+"""
+Measures the memory per entity of n concurrent processes, each suspended in
+a 'yield hold' with its generator and event notice, for
+
+- eager: a Process which creates its three priority dicts in __init__, as
+  Process did before they were created on first use,
+- Process,
+- LightProcess, which has no per-instance __dict__.
+
+Usage: python benchmarks/memory.py [n]
+
+"""
+from __future__ import print_function
+
+import gc
+import os
+import sys
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+# Import the SimPy package of this checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SimPy.Simulation import Simulation, Process, LightProcess, hold
+
+
+class Eager(Process):
+    def __init__(self, sim):
+        Process.__init__(self, sim=sim)
+        self._priority = {}
+        self._getpriority = {}
+        self._putpriority = {}
+
+    def run(self):
+        yield hold, self, 1
+
+
+class Plain(Process):
+    def run(self):
+        yield hold, self, 1
+
+
+class Light(LightProcess):
+    __slots__ = ()
+
+    def run(self):
+        yield hold, self, 1
+
+
+def perEntity(cls, n):
+    sim = Simulation()
+    gc.collect()
+    tracemalloc.start()
+    procs = []
+    for i in range(n):
+        p = cls(sim=sim)
+        sim.activate(p, p.run())
+        procs.append(p)
+    # start all generators: each process is suspended in its hold
+    sim.simulate(until=0.5)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return float(size) / n
+
+
+if __name__ == '__main__':
+    if tracemalloc is None:
+        sys.exit('tracemalloc is required')
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    for name, cls in (('eager', Eager), ('Process', Plain),
+                      ('LightProcess', Light)):
+        print('%-13s %7.1f bytes/entity' % (name, perEntity(cls, n)))
@@ -0,0 +1,114 @@
+# coding=utf-8
+"""
+Measures the cost of event notices.
+
+- memory: bytes per pending event notice, for the former list notices
+  [at, sortpr, proc, cancelled] and for the tuple notices (at, sortpr, proc)
+  used now, in a heap of n notices.
+- heap: push / pop throughput of a heap of n notices for both formats.
+- model: events per second and bytes allocated per activation of a
+  Simulation whose n processes loop over 'yield hold, self, expovariate(1)'.
+
+Usage: python benchmarks/notices.py [n] [events]
+
+"""
+from __future__ import print_function
+
+import gc
+import os
+import random
+import sys
+import time
+from heapq import heappush, heappop
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+# Import the SimPy package of this checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SimPy.Simulation import Simulation, Process, hold
+
+
+def as_list(at, sortpr, proc):
+    return [at, sortpr, proc, False]
+
+
+def as_tuple(at, sortpr, proc):
+    return (at, sortpr, proc)
+
+
+FORMATS = [('list', as_list), ('tuple', as_tuple)]
+
+
+def memory(make, n):
+    if tracemalloc is None:
+        return float('nan')
+    rnd = random.Random(0)
+    times = [rnd.random() for i in range(n)]
+    gc.collect()
+    tracemalloc.start()
+    heap = []
+    for i in range(n):
+        heappush(heap, make(times[i], i, None))
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return float(size) / n
+
+
+def throughput(make, n, ops):
+    rnd = random.Random(0)
+    heap = []
+    for i in range(n):
+        heappush(heap, make(rnd.random(), i, None))
+    start = time.time()
+    for i in range(ops):
+        rec = heappop(heap)
+        heappush(heap, make(rec[0] + rnd.random(), n + i, None))
+    return ops / (time.time() - start)
+
+
+class Holder(Process):
+    def run(self, rnd):
+        while True:
+            yield hold, self, rnd.expovariate(1.0)
+
+
+def model(n, events):
+    rnd = random.Random(0)
+    sim = Simulation()
+    procs = [Holder(sim=sim) for i in range(n)]
+    gens = [p.run(rnd) for p in procs]
+    gc.collect()
+    if tracemalloc is not None:
+        tracemalloc.start()
+    for p, g in zip(procs, gens):
+        sim.activate(p, g, delay=rnd.random())
+    if tracemalloc is not None:
+        perNotice = float(tracemalloc.get_traced_memory()[0]) / n
+        tracemalloc.stop()
+    else:
+        perNotice = float('nan')
+    step = sim.step
+    start = time.time()
+    for i in range(events):
+        step()
+    return events / (time.time() - start), perNotice
+
+
+def main(n, events):
+    print('n = %s pending notices' % n)
+    for name, make in FORMATS:
+        print('%-6s memory: %6.1f bytes/notice   heap: %9.0f push+pop/s' % (
+            name, memory(make, n), throughput(make, n, events)))
+    rate, perNotice = model(n, events)
+    print('model  %s events: %9.0f events/s, %6.1f bytes/activation' % (
+        events, rate, perNotice))
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    events = int(sys.argv[2]) if len(sys.argv) > 2 else 1000000
+    main(n, events)
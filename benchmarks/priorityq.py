@@ -0,0 +1,80 @@
+# coding=utf-8
+"""
+Compares PriorityQ with the linear insertion it replaced, for a Resource
+with a long queue of prioritized requests.
+
+n customers request a Resource of capacity 1 with random priorities at
+time 0; each holds it for one time unit. The measurement reports the best
+requests per second of three alternating runs of both queues.
+
+Usage: python benchmarks/priorityq.py [n ...]
+
+"""
+from __future__ import print_function
+
+import gc
+import os
+import random
+import sys
+import time
+
+# Import the SimPy package of this checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SimPy.Simulation import Simulation, Process, Resource, PriorityQ, FIFO, \
+        request, release, hold
+
+
+class LinearPriorityQ(FIFO):
+    """The former PriorityQ: a list kept sorted by scanning for the
+    insertion point."""
+    def enter(self, obj):
+        if len(self):
+            ix = self.resource
+            if self[-1]._priority[ix] >= obj._priority[ix]:
+                self.append(obj)
+            else:
+                z = 0
+                while self[z]._priority[ix] >= obj._priority[ix]:
+                    z += 1
+                self.insert(z, obj)
+        else:
+            self.append(obj)
+        if self.monit:
+            self.moni.observe(len(self),t = self.moni.sim.now())
+        if self.resource.sim._hooks:
+            self.resource.sim._notify('enter', self, obj)
+
+
+class Customer(Process):
+    def visit(self, res, priority):
+        yield request, self, res, priority
+        yield hold, self, 1
+        yield release, self, res
+
+
+def run(n, qType):
+    rnd = random.Random(0)
+    sim = Simulation()
+    res = Resource(qType=qType, sim=sim)
+    # the Resource uses priorities with either queue
+    res._prioritized = True
+    for i in range(n):
+        c = Customer(sim=sim)
+        sim.activate(c, c.visit(res, rnd.randint(0, 100)))
+    start = time.time()
+    sim.simulate(until=1e100)
+    return n / (time.time() - start)
+
+
+if __name__ == '__main__':
+    sizes = [int(n) for n in sys.argv[1:]] or [1000, 10000]
+    for n in sizes:
+        best = {LinearPriorityQ: 0, PriorityQ: 0}
+        for i in range(3):
+            for qType in (LinearPriorityQ, PriorityQ):
+                gc.collect()
+                best[qType] = max(best[qType], run(n, qType))
+        for qType in (LinearPriorityQ, PriorityQ):
+            print('%6s %-16s %9.0f requests/s' % (n, qType.__name__,
+                                                  best[qType]))
@@ -0,0 +1,95 @@
+# coding=utf-8
+"""
+Compares timer processes with scheduled calls (Simulation.schedule) for the
+same job: bump a counter at exponentially distributed times.
+
+- one-shot: a job per arrival; a timer process is created and activated per
+  job, holds until the job is due and terminates, or a call is scheduled.
+- recurring: a single timer process holds between the jobs, or the scheduled
+  call schedules the next one.
+
+The measurement reports the best jobs per second of five alternating runs of
+both forms.
+
+Usage: python benchmarks/schedule.py [jobs]
+
+"""
+from __future__ import print_function
+
+import gc
+import os
+import random
+import sys
+import time
+
+# Import the SimPy package of this checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SimPy.Simulation import Simulation, Process, hold
+
+
+class OneShot(Process):
+    def run(self, delay, counter):
+        yield hold, self, delay
+        counter[0] += 1
+
+
+class Recurring(Process):
+    def run(self, n, rnd, counter):
+        for i in range(n):
+            yield hold, self, rnd.expovariate(1.0)
+            counter[0] += 1
+
+
+def oneShot(jobs, scheduled):
+    rnd = random.Random(0)
+    sim = Simulation()
+    counter = [0]
+
+    def bump():
+        counter[0] += 1
+    start = time.time()
+    for i in range(jobs):
+        delay = rnd.expovariate(1.0)
+        if scheduled:
+            sim.schedule(bump, delay=delay)
+        else:
+            t = OneShot(sim=sim)
+            sim.activate(t, t.run(delay, counter))
+    sim.simulate(until=1e100)
+    assert counter[0] == jobs
+    return jobs / (time.time() - start)
+
+
+def recurring(jobs, scheduled):
+    rnd = random.Random(0)
+    sim = Simulation()
+    counter = [0]
+    if scheduled:
+        def bump():
+            counter[0] += 1
+            if counter[0] < jobs:
+                sim.schedule(bump, delay=rnd.expovariate(1.0))
+        sim.schedule(bump, delay=rnd.expovariate(1.0))
+    else:
+        t = Recurring(sim=sim)
+        sim.activate(t, t.run(jobs, rnd, counter))
+    start = time.time()
+    sim.simulate(until=1e100)
+    assert counter[0] == jobs
+    return jobs / (time.time() - start)
+
+
+if __name__ == '__main__':
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    for scenario in (oneShot, recurring):
+        best = {False: 0, True: 0}
+        for i in range(5):
+            for scheduled in (False, True):
+                gc.collect()
+                best[scheduled] = max(best[scheduled],
+                                      scenario(jobs, scheduled))
+        for scheduled in (False, True):
+            print('%-10s %-9s %9.0f jobs/s' % (
+                  scenario.__name__, scheduled and 'schedule' or 'process',
+                  best[scheduled]))
@@ -0,0 +1,92 @@
+# coding=utf-8
+"""
+Compares a Store sorted by addSort with PriorityStore, ordered by a key
+function or by the same sort function.
+
+The Store is filled with n parcels of random weight at time 0. A courier
+then gets the lightest parcel and puts a new one, once per time unit, for
+m time units. The measurement reports the best puts and gets per second of
+three alternating runs of the three forms.
+
+Usage: python benchmarks/sortedstore.py [n ...]
+
+"""
+from __future__ import print_function
+
+import gc
+import os
+import random
+import sys
+import time
+
+# Import the SimPy package of this checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SimPy.Simulation import Simulation, Process, Store, PriorityStore, \
+        get, put, hold
+
+
+class Parcel(object):
+    def __init__(self, weight):
+        self.weight = weight
+
+
+def lightFirst(self, par):
+    tmplist = [(x.weight, i, x) for i, x in enumerate(par)]
+    tmplist.sort()
+    return [x for (key, i, x) in tmplist]
+
+
+def byWeight(parcel):
+    return parcel.weight
+
+
+class Courier(Process):
+    def run(self, store, rnd, m):
+        for i in range(m):
+            yield get, self, store
+            yield put, self, store, [Parcel(rnd.random())]
+            yield hold, self, 1
+
+
+class Filler(Process):
+    def run(self, store, parcels):
+        yield put, self, store, parcels
+
+
+def makeStore(form, sim):
+    if form == 'Store+addSort':
+        store = Store(sim=sim)
+        store.addSort(lightFirst)
+    elif form == 'PriorityStore':
+        store = PriorityStore(key=byWeight, sim=sim)
+    else:
+        store = PriorityStore(sim=sim)
+        store.addSort(lightFirst)
+    return store
+
+
+def run(n, form, m=2000):
+    rnd = random.Random(0)
+    sim = Simulation()
+    store = makeStore(form, sim)
+    f = Filler(sim=sim)
+    sim.activate(f, f.run(store, [Parcel(rnd.random()) for i in range(n)]))
+    c = Courier(sim=sim)
+    sim.activate(c, c.run(store, rnd, m), delay=1)
+    start = time.time()
+    sim.simulate(until=m + 1)
+    return 2 * m / (time.time() - start)
+
+
+if __name__ == '__main__':
+    sizes = [int(n) for n in sys.argv[1:]] or [100, 1000, 10000]
+    forms = ('Store+addSort', 'PriorityStore', 'PriorityStore+addSort')
+    for n in sizes:
+        best = dict((form, 0) for form in forms)
+        for i in range(3):
+            for form in forms:
+                gc.collect()
+                best[form] = max(best[form], run(n, form))
+        for form in forms:
+            print('%5s %-21s %9.0f puts and gets/s' % (n, form, best[form]))
@@ -0,0 +1,63 @@
+# coding=utf-8
+"""
+Compares Store and DequeStore for long buffers.
+
+A producer puts n items into the Store at time 0, one put per item; a
+consumer then gets them one at a time, one per time unit. The measurement
+reports the best items per second (put and got) of three alternating runs
+of both Store types.
+
+Usage: python benchmarks/store.py [n ...]
+
+"""
+from __future__ import print_function
+
+import gc
+import os
+import sys
+import time
+
+# Import the SimPy package of this checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SimPy.Simulation import Simulation, Process, Store, DequeStore, \
+        get, put, hold
+
+
+class Producer(Process):
+    def produce(self, store, n):
+        for i in range(n):
+            yield put, self, store, [i]
+
+
+class Consumer(Process):
+    def consume(self, store, n):
+        for i in range(n):
+            yield get, self, store
+            yield hold, self, 1
+
+
+def run(n, storeType):
+    sim = Simulation()
+    store = storeType(sim=sim)
+    p = Producer(sim=sim)
+    sim.activate(p, p.produce(store, n))
+    c = Consumer(sim=sim)
+    sim.activate(c, c.consume(store, n), delay=1)
+    start = time.time()
+    sim.simulate(until=2 * n)
+    return n / (time.time() - start)
+
+
+if __name__ == '__main__':
+    sizes = [int(n) for n in sys.argv[1:]] or [1000, 10000, 100000]
+    types = (Store, DequeStore)
+    for n in sizes:
+        best = dict((storeType, 0) for storeType in types)
+        for i in range(3):
+            for storeType in types:
+                gc.collect()
+                best[storeType] = max(best[storeType], run(n, storeType))
+        for storeType in types:
+            print('%6s %-10s %9.0f items/s' % (
+                  n, storeType.__name__, best[storeType]))
@@ -0,0 +1,70 @@
+# coding=utf-8
+"""
+Compares the cost of tracing a Simulation as text with SimulationTrace and
+as a binary trace with SimPy.TraceFile.TraceWriter.
+
+n processes share a Resource and loop over request, hold and release. The
+measurement reports events per second untraced, traced as text into a file
+and traced into a binary trace file, and the sizes of both files.
+
+Usage: python benchmarks/tracing.py [events]
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import tempfile
+import time
+
+# Import the SimPy package of this checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SimPy.Simulation import Simulation, Process, Resource, hold, request, \
+        release
+from SimPy.SimulationTrace import SimulationTrace
+from SimPy.TraceFile import TraceWriter
+
+
+class User(Process):
+    def run(self, res):
+        while True:
+            yield request, self, res
+            yield hold, self, 1
+            yield release, self, res
+
+
+def run(form, events, path, n=100):
+    if form == 'text':
+        sim = SimulationTrace()
+        sim.trace.tchange(outfile=open(path, 'w'))
+    else:
+        sim = Simulation()
+    res = Resource(capacity=n // 2, sim=sim)
+    for i in range(n):
+        p = User(name='User %s' % i, sim=sim)
+        sim.activate(p, p.run(res))
+    if form == 'binary':
+        writer = TraceWriter(sim, path)
+    step = sim.step
+    start = time.time()
+    for i in range(events):
+        step()
+    if form == 'text':
+        sim.trace.outfile.close()
+    elif form == 'binary':
+        writer.close()
+    return events / (time.time() - start)
+
+
+if __name__ == '__main__':
+    events = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    fd, path = tempfile.mkstemp()
+    os.close(fd)
+    try:
+        for form in ('none', 'text', 'binary'):
+            rate = run(form, events, path)
+            size = form != 'none' and os.path.getsize(path) or 0
+            print('%-7s %9.0f events/s %12s bytes' % (form, rate, size))
+    finally:
+        os.remove(path)
@@ -0,0 +1,70 @@
+# coding=utf-8
+"""
+Compares 'yield waituntil' conditions tested after every event with
+conditions which declare the object they depend on.
+
+n processes wait until a Level holds more than their threshold while a
+producer puts one unit per time unit and a number of unrelated processes
+hold. The measurement reports events per second for both forms.
+
+Usage: python benchmarks/waituntil.py [n]
+
+"""
+from __future__ import print_function
+
+import os
+import sys
+import time
+
+# Import the SimPy package of this checkout
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from SimPy.Simulation import Simulation, Process, Level, hold, put, waituntil
+
+
+class Producer(Process):
+    def run(self, tank):
+        while True:
+            yield hold, self, 1
+            yield put, self, tank, 1
+
+
+class Ticker(Process):
+    def run(self):
+        while True:
+            yield hold, self, 0.1
+
+
+class Waiter(Process):
+    def run(self, tank, threshold, watched):
+        cond = lambda: tank.amount > threshold
+        if watched:
+            yield waituntil, self, cond, tank
+        else:
+            yield waituntil, self, cond
+
+
+def run(n, watched):
+    sim = Simulation()
+    tank = Level(sim=sim)
+    p = Producer(sim=sim)
+    sim.activate(p, p.run(tank))
+    for i in range(10):
+        t = Ticker(sim=sim)
+        sim.activate(t, t.run())
+    for i in range(n):
+        w = Waiter(sim=sim)
+        sim.activate(w, w.run(tank, 10 * n + i, watched))
+    events = 0
+    start = time.time()
+    while sim.now() < 50:
+        sim.step()
+        events += 1
+    return events / (time.time() - start)
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    for watched in (False, True):
+        print('%-10s %9.0f events/s' % (
+            watched and 'watched' or 'every step', run(n, watched)))
@@ -13,13 +13,12 @@ py_ver = version_info[0]
 def stepper(whichsim):
     evlist = whichsim._timestamps
     while True:
-        if not evlist:
+        rec = evlist.first()  # next event notice which is not cancelled
+        if rec is None:
             print("No more events.")
             break
-        tEvt = evlist[0][0]
-        who = evlist[0][2]
-        while evlist[0][3]:  # skip cancelled event notices
-            whichsim.step()
+        tEvt = rec[0]
+        who = rec[2]
         print("\nTime now: {0}, next event at: {1} for process: {2} ".format(
             whichsim.now(), tEvt, who.name))
 
@@ -49,8 +48,10 @@ def stepper(whichsim):
                 print("Events scheduled: \n{0}".format(
                     whichsim.allEventNotices()))
             elif cmd[0] == 'p':
-                while evlist and evlist[0][2].name != cmd[1:]:
+                rec = evlist.first()
+                while rec is not None and rec[2].name != cmd[1:]:
                     whichsim.step()
+                    rec = evlist.first()
             else:
                 print("{0} not a valid command".format(cmd))
 